@@ -1,20 +1,56 @@
-"""Accept all tracked changes in a DOCX file using LibreOffice.
+"""Accept tracked changes in a DOCX file.
 
-Requires LibreOffice (soffice) to be installed.
+By default the changes are accepted natively: every story part under word/
+(document, headers, footers, footnotes, endnotes, comments, styles,
+numbering) is rewritten in one lxml pass. Insertions and move destinations
+are unwrapped; deletions, move sources and their range markers are dropped;
+property changes (w:rPrChange, w:pPrChange, ...) are resolved to the current
+formatting; deleted paragraph marks merge paragraphs, and deleted table rows
+are removed. Parts without tracked changes are copied through byte for byte.
+
+    python accept_changes.py input.docx output.docx [--author NAME]
+
+--author accepts only that author's changes. --engine libreoffice uses the
+previous LibreOffice macro instead (requires soffice).
 """
 
 import argparse
-import logging
+import os
 import shutil
 import subprocess
+import tempfile
+import zipfile
 from pathlib import Path
 
-from office.soffice import get_soffice_env
+import lxml.etree
+
+from office.soffice import get_soffice_env, libreoffice_profile, pool_request
 
-logger = logging.getLogger(__name__)
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
 
-LIBREOFFICE_PROFILE = "/tmp/libreoffice_docx_profile"
-MACRO_DIR = f"{LIBREOFFICE_PROFILE}/user/basic/Standard"
+PROPERTY_CHANGES = {
+    "rPrChange",
+    "pPrChange",
+    "sectPrChange",
+    "tblPrChange",
+    "tblPrExChange",
+    "tblGridChange",
+    "trPrChange",
+    "tcPrChange",
+    "numberingChange",
+}
+RANGE_STARTS = {
+    "moveFromRangeStart",
+    "moveToRangeStart",
+    "customXmlInsRangeStart",
+    "customXmlDelRangeStart",
+    "customXmlMoveFromRangeStart",
+    "customXmlMoveToRangeStart",
+}
+RANGE_ENDS = {name.replace("Start", "End") for name in RANGE_STARTS}
+MARKER_PARENTS = {"rPr", "numPr", "trPr"}
+
+LIBREOFFICE_TIMEOUT = 30
 
 ACCEPT_CHANGES_MACRO = """<?xml version="1.0" encoding="UTF-8"?>
 <!DOCTYPE script:module PUBLIC "-//OpenOffice.org//DTD OfficeDocument 1.0//EN" "module.dtd">
@@ -36,6 +72,8 @@ ACCEPT_CHANGES_MACRO = """<?xml version="1.0" encoding="UTF-8"?>
 def accept_changes(
     input_file: str,
     output_file: str,
+    author: str | None = None,
+    engine: str = "native",
 ) -> tuple[None, str]:
     input_path = Path(input_file)
     output_path = Path(output_file)
@@ -46,39 +84,60 @@ def accept_changes(
     if not input_path.suffix.lower() == ".docx":
         return None, f"Error: Input file is not a DOCX file: {input_file}"
 
+    if engine == "native":
+        try:
+            count = accept_tracked_changes(input_path, output_path, author)
+        except (OSError, zipfile.BadZipFile, lxml.etree.XMLSyntaxError) as e:
+            return None, f"Error: Failed to accept tracked changes: {e}"
+        scope = f" by {author}" if author else ""
+        return (
+            None,
+            f"Successfully accepted {count} tracked changes{scope}: {input_file} -> {output_file}",
+        )
+
+    if author:
+        return None, "Error: --author is only supported by the native engine"
+
     try:
         output_path.parent.mkdir(parents=True, exist_ok=True)
         shutil.copy2(input_path, output_path)
     except Exception as e:
         return None, f"Error: Failed to copy input file to output location: {e}"
 
-    if not _setup_libreoffice_macro():
-        return None, "Error: Failed to setup LibreOffice macro"
-
-    cmd = [
-        "soffice",
-        "--headless",
-        f"-env:UserInstallation=file://{LIBREOFFICE_PROFILE}",
-        "--norestore",
-        "vnd.sun.star.script:Standard.Module1.AcceptAllTrackedChanges?language=Basic&location=application",
-        str(output_path.absolute()),
-    ]
-
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            check=False,
-            env=get_soffice_env(),
-        )
-    except subprocess.TimeoutExpired:
+    response = pool_request(
+        {"op": "accept_changes", "input": str(output_path.absolute())},
+        timeout=LIBREOFFICE_TIMEOUT,
+    )
+    if response is not None:
+        if not response.get("ok"):
+            return None, f"Error: LibreOffice failed: {response.get('error')}"
         return (
             None,
             f"Successfully accepted all tracked changes: {input_file} -> {output_file}",
         )
 
+    try:
+        with libreoffice_profile(ACCEPT_CHANGES_MACRO) as profile:
+            result = subprocess.run(
+                [
+                    "soffice",
+                    "--headless",
+                    f"-env:UserInstallation={profile.as_uri()}",
+                    "--norestore",
+                    "vnd.sun.star.script:Standard.Module1.AcceptAllTrackedChanges?language=Basic&location=application",
+                    str(output_path.absolute()),
+                ],
+                capture_output=True,
+                text=True,
+                timeout=LIBREOFFICE_TIMEOUT,
+                check=False,
+                env=get_soffice_env(),
+            )
+    except subprocess.TimeoutExpired:
+        return None, f"Error: LibreOffice timed out after {LIBREOFFICE_TIMEOUT}s"
+    except (OSError, RuntimeError) as e:
+        return None, f"Error: Failed to set up LibreOffice profile: {e}"
+
     if result.returncode != 0:
         return None, f"Error: LibreOffice failed: {result.stderr}"
 
@@ -88,47 +147,175 @@ def accept_changes(
     )
 
 
-def _setup_libreoffice_macro() -> bool:
-    macro_dir = Path(MACRO_DIR)
-    macro_file = macro_dir / "Module1.xba"
-
-    if macro_file.exists() and "AcceptAllTrackedChanges" in macro_file.read_text():
-        return True
-
-    if not macro_dir.exists():
-        subprocess.run(
-            [
-                "soffice",
-                "--headless",
-                f"-env:UserInstallation=file://{LIBREOFFICE_PROFILE}",
-                "--terminate_after_init",
-            ],
-            capture_output=True,
-            timeout=10,
-            check=False,
-            env=get_soffice_env(),
-        )
-        macro_dir.mkdir(parents=True, exist_ok=True)
+def accept_tracked_changes(input_path: Path, output_path: Path, author: str | None = None) -> int:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(suffix=".docx", dir=output_path.parent)
+    os.close(fd)
 
+    count = 0
     try:
-        macro_file.write_text(ACCEPT_CHANGES_MACRO)
-        return True
-    except Exception as e:
-        logger.warning(f"Failed to setup LibreOffice macro: {e}")
-        return False
+        with zipfile.ZipFile(input_path) as zin, zipfile.ZipFile(temp_name, "w") as zout:
+            for info in zin.infolist():
+                data = zin.read(info)
+                if info.filename.startswith("word/") and info.filename.endswith(".xml"):
+                    tree = lxml.etree.ElementTree(lxml.etree.fromstring(data, _parser()))
+                    changes = accept_changes_in_tree(tree.getroot(), author)
+                    if changes:
+                        count += changes
+                        data = _xml_declaration(tree) + lxml.etree.tostring(
+                            tree, encoding="UTF-8"
+                        )
+                zout.writestr(info, data)
+        os.replace(temp_name, output_path)
+    except BaseException:
+        Path(temp_name).unlink(missing_ok=True)
+        raise
+    return count
+
+
+def accept_changes_in_tree(root, author: str | None = None) -> int:
+    unwrap, drop, merge_paragraphs, drop_rows = [], [], [], []
+    dropped_ranges = set()
+
+    for elem in root.iter(f"{W}*"):
+        name = elem.tag[len(W):]
+        parent = elem.getparent()
+        parent_name = _local_name(parent) if parent is not None else None
+
+        if name in RANGE_ENDS:
+            if elem.get(f"{W}id") in dropped_ranges or author is None:
+                drop.append(elem)
+            continue
+        if not _matches_author(elem, author):
+            continue
+
+        if name in PROPERTY_CHANGES:
+            drop.append(elem)
+        elif name in RANGE_STARTS:
+            dropped_ranges.add(elem.get(f"{W}id"))
+            drop.append(elem)
+        elif name in ("ins", "del", "moveTo", "moveFrom") and parent_name in MARKER_PARENTS:
+            drop.append(elem)
+            if name in ("del", "moveFrom"):
+                if parent_name == "trPr":
+                    drop_rows.append(parent.getparent())
+                elif parent_name == "rPr" and _local_name(parent.getparent()) == "pPr":
+                    merge_paragraphs.append(parent.getparent().getparent())
+        elif name in ("ins", "moveTo"):
+            unwrap.append(elem)
+        elif name in ("del", "moveFrom"):
+            drop.append(elem)
+        elif name == "cellIns":
+            drop.append(elem)
+        elif name == "cellDel":
+            drop.append(parent.getparent())
+
+    changes = len(unwrap) + len(
+        [e for e in drop if _local_name(e) not in RANGE_STARTS | RANGE_ENDS]
+    )
+
+    for elem in drop:
+        _remove_element(elem)
+    for row in drop_rows:
+        _remove_element(row)
+    for elem in unwrap:
+        _unwrap_element(elem)
+    for paragraph in reversed(merge_paragraphs):
+        _merge_with_next_paragraph(paragraph)
+
+    return changes
+
+
+def _parser():
+    return lxml.etree.XMLParser(
+        huge_tree=True,
+        resolve_entities=False,
+        no_network=True,
+        strip_cdata=False,
+    )
+
+
+def _xml_declaration(tree) -> bytes:
+    standalone = ' standalone="yes"' if tree.docinfo.standalone else ""
+    return f'<?xml version="1.0" encoding="UTF-8"{standalone}?>\n'.encode("utf-8")
+
+
+def _local_name(elem) -> str:
+    return elem.tag.rpartition("}")[2]
+
+
+def _matches_author(elem, author: str | None) -> bool:
+    return author is None or elem.get(f"{W}author") == author
+
+
+def _remove_element(elem) -> None:
+    parent = elem.getparent()
+    if parent is None:
+        return
+    if elem.tail:
+        prev = elem.getprevious()
+        if prev is not None:
+            prev.tail = (prev.tail or "") + elem.tail
+        else:
+            parent.text = (parent.text or "") + elem.tail
+    parent.remove(elem)
+
+
+def _unwrap_element(elem) -> None:
+    parent = elem.getparent()
+    if parent is None:
+        return
+    if elem.text:
+        prev = elem.getprevious()
+        if prev is not None:
+            prev.tail = (prev.tail or "") + elem.text
+        else:
+            parent.text = (parent.text or "") + elem.text
+
+    children = list(elem)
+    if not children:
+        # Slice assignment would drop the tail along with the element.
+        _remove_element(elem)
+        return
+    children[-1].tail = (children[-1].tail or "") + (elem.tail or "")
+    elem.tail = None
+    index = parent.index(elem)
+    parent[index:index + 1] = children
+    if not children:
+        _remove_element(elem)
+
+
+def _merge_with_next_paragraph(paragraph) -> None:
+    following = paragraph.getnext()
+    while following is not None and not isinstance(following.tag, str):
+        following = following.getnext()
+    if following is None or following.tag != f"{W}p":
+        return
+
+    content = [child for child in paragraph if child.tag != f"{W}pPr"]
+    index = 1 if len(following) and following[0].tag == f"{W}pPr" else 0
+    following[index:index] = content
+    _remove_element(paragraph)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Accept all tracked changes in a DOCX file"
+        description="Accept tracked changes in a DOCX file"
     )
     parser.add_argument("input_file", help="Input DOCX file with tracked changes")
     parser.add_argument(
         "output_file", help="Output DOCX file (clean, no tracked changes)"
     )
+    parser.add_argument("--author", help="Accept only this author's changes")
+    parser.add_argument(
+        "--engine",
+        choices=["native", "libreoffice"],
+        default="native",
+        help="Accept changes natively (default) or with a LibreOffice macro",
+    )
     args = parser.parse_args()
 
-    _, message = accept_changes(args.input_file, args.output_file)
+    _, message = accept_changes(args.input_file, args.output_file, args.author, args.engine)
     print(message)
 
     if "Error" in message:
@@ -3,6 +3,12 @@
 Usage:
     python comment.py unpacked/ 0 "Comment text"
     python comment.py unpacked/ 1 "Reply text" --parent 0
+    python comment.py unpacked/ --batch comments.json
+
+The batch file is a JSON list of comments, each with "text" and optional
+"id", "author", "initials" and "parent" (the id of an existing comment or of an
+earlier entry in the list). Missing ids are assigned after the highest
+existing id. Each comments part is read and written once per batch.
 
 Text should be pre-escaped XML (e.g., &amp; for &, &#x2019; for smart quotes).
 
@@ -14,8 +20,9 @@ After running, add markers to document.xml:
 """
 
 import argparse
+import json
 import random
-import shutil
+import re
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
@@ -65,8 +72,24 @@ Nest markers inside parent {pid}'s markers (markers must be direct children of w
   <w:r><w:rPr><w:rStyle w:val="CommentReference"/></w:rPr><w:commentReference w:id="{cid}"/></w:r>"""
 
 
-def _generate_hex_id() -> str:
-    return f"{random.randint(0, 0x7FFFFFFE):08X}"
+COMMENT_PARTS = [
+    ("comments.xml", "w:comments"),
+    ("commentsExtended.xml", "w15:commentsEx"),
+    ("commentsIds.xml", "w16cid:commentsIds"),
+    ("commentsExtensible.xml", "w16cex:commentsExtensible"),
+]
+
+# Parts whose paragraphs share the w14:paraId space with comment paragraphs.
+BODY_PART_PATTERNS = ("document.xml", "header*.xml", "footer*.xml", "footnotes.xml", "endnotes.xml")
+PARA_ID_RE = re.compile(r'\bw14:paraId="([0-9A-Fa-f]+)"')
+
+
+def _generate_hex_id(taken: set[str]) -> str:
+    while True:
+        hex_id = f"{random.randint(0, 0x7FFFFFFE):08X}"
+        if hex_id not in taken:
+            taken.add(hex_id)
+            return hex_id
 
 
 SMART_QUOTE_ENTITIES = {
@@ -83,25 +106,78 @@ def _encode_smart_quotes(text: str) -> str:
     return text
 
 
-def _append_xml(xml_path: Path, root_tag: str, content: str) -> None:
-    dom = defusedxml.minidom.parseString(xml_path.read_text(encoding="utf-8"))
+def _append_xml(dom, root_tag: str, content: str) -> None:
     root = dom.getElementsByTagName(root_tag)[0]
     ns_attrs = " ".join(f'xmlns:{k}="{v}"' for k, v in NS.items())
     wrapper_dom = defusedxml.minidom.parseString(f"<root {ns_attrs}>{content}</root>")
     for child in wrapper_dom.documentElement.childNodes:  
         if child.nodeType == child.ELEMENT_NODE:
             root.appendChild(dom.importNode(child, True))
+
+
+def _write_xml(dom, xml_path: Path) -> None:
     output = _encode_smart_quotes(dom.toxml(encoding="UTF-8").decode("utf-8"))
     xml_path.write_text(output, encoding="utf-8")
 
 
-def _find_para_id(comments_path: Path, comment_id: int) -> str | None:
-    dom = defusedxml.minidom.parseString(comments_path.read_text(encoding="utf-8"))
-    for c in dom.getElementsByTagName("w:comment"):
-        if c.getAttribute("w:id") == str(comment_id):
-            for p in c.getElementsByTagName("w:p"):
-                if pid := p.getAttribute("w14:paraId"):
-                    return pid
+def _collect_existing_ids(doms: dict) -> tuple[dict[str, str], set[str], set[str]]:
+    comment_para_ids = {}
+    for c in doms["comments.xml"].getElementsByTagName("w:comment"):
+        comment_para_ids[c.getAttribute("w:id")] = next(
+            (
+                pid
+                for p in c.getElementsByTagName("w:p")
+                if (pid := p.getAttribute("w14:paraId"))
+            ),
+            "",
+        )
+
+    para_ids = set()
+    for p in doms["comments.xml"].getElementsByTagName("w:p"):
+        para_ids.add(p.getAttribute("w14:paraId"))
+    for ex in doms["commentsExtended.xml"].getElementsByTagName("w15:commentEx"):
+        para_ids.add(ex.getAttribute("w15:paraId"))
+
+    durable_ids = set()
+    for cid in doms["commentsIds.xml"].getElementsByTagName("w16cid:commentId"):
+        para_ids.add(cid.getAttribute("w16cid:paraId"))
+        durable_ids.add(cid.getAttribute("w16cid:durableId"))
+    for ext in doms["commentsExtensible.xml"].getElementsByTagName(
+        "w16cex:commentExtensible"
+    ):
+        durable_ids.add(ext.getAttribute("w16cex:durableId"))
+
+    para_ids.discard("")
+    durable_ids.discard("")
+    return comment_para_ids, para_ids, durable_ids
+
+
+def _collect_body_para_ids(word: Path) -> set[str]:
+    # A regex scan is enough here and avoids building a DOM of the whole body.
+    para_ids = set()
+    for pattern in BODY_PART_PATTERNS:
+        for path in word.glob(pattern):
+            text = path.read_text(encoding="utf-8")
+            para_ids.update(pid.upper() for pid in PARA_ID_RE.findall(text))
+    return para_ids
+
+
+def _validate_entries(comments) -> str | None:
+    if not isinstance(comments, list):
+        return "Error: Comments must be a list"
+    for index, entry in enumerate(comments):
+        if not isinstance(entry, dict):
+            return f"Error: Entry {index} must be an object"
+        if not isinstance(entry.get("text"), str):
+            return f'Error: Entry {index} needs a "text" string'
+        comment_id = entry.get("id")
+        if comment_id is not None and (
+            isinstance(comment_id, bool) or not str(comment_id).isdigit()
+        ):
+            return (
+                f"Error: Entry {index}: comment id must be a non-negative integer, "
+                f"got {comment_id!r}"
+            )
     return None
 
 
@@ -215,91 +291,149 @@ def _ensure_comment_content_types(unpacked_dir: Path) -> None:
     ct_path.write_bytes(dom.toxml(encoding="UTF-8"))
 
 
-def add_comment(
+def add_comments(
     unpacked_dir: str,
-    comment_id: int,
-    text: str,
-    author: str = "Claude",
-    initials: str = "C",
-    parent_id: int | None = None,
-) -> tuple[str, str]:
+    comments: list[dict],
+) -> tuple[list[dict], str]:
     word = Path(unpacked_dir) / "word"
     if not word.exists():
-        return "", f"Error: {word} not found"
-
-    para_id, durable_id = _generate_hex_id(), _generate_hex_id()
+        return [], f"Error: {word} not found"
+    if error := _validate_entries(comments):
+        return [], error
+
+    first_comment = not (word / "comments.xml").exists()
+    doms = {}
+    for name, _ in COMMENT_PARTS:
+        path = word / name
+        source = path if path.exists() else TEMPLATE_DIR / name
+        doms[name] = defusedxml.minidom.parseString(source.read_text(encoding="utf-8"))
+
+    comment_para_ids, para_ids, durable_ids = _collect_existing_ids(doms)
+    para_ids |= _collect_body_para_ids(word)
+    next_id = max((int(cid) for cid in comment_para_ids if cid.isdigit()), default=-1) + 1
     ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    comments = word / "comments.xml"
-    first_comment = not comments.exists()
+    fragments = {name: [] for name, _ in COMMENT_PARTS}
+    added = []
+    for entry in comments:
+        comment_id = entry.get("id")
+        if comment_id is None:
+            comment_id = next_id
+        if str(comment_id) in comment_para_ids:
+            return [], f"Error: Comment {comment_id} already exists"
+        next_id = max(next_id, int(comment_id) + 1)
+
+        parent_id = entry.get("parent")
+        parent_para = None
+        if parent_id is not None:
+            parent_para = comment_para_ids.get(str(parent_id))
+            if not parent_para:
+                return [], f"Error: Parent comment {parent_id} not found"
+
+        para_id = _generate_hex_id(para_ids)
+        durable_id = _generate_hex_id(durable_ids)
+        comment_para_ids[str(comment_id)] = para_id
+
+        fragments["comments.xml"].append(
+            COMMENT_XML.format(
+                id=comment_id,
+                author=entry.get("author", "Claude"),
+                date=ts,
+                initials=entry.get("initials", "C"),
+                para_id=para_id,
+                text=entry["text"],  
+            ),
+        )
+        if parent_para is not None:
+            fragments["commentsExtended.xml"].append(
+                f'<w15:commentEx w15:paraId="{para_id}" w15:paraIdParent="{parent_para}" w15:done="0"/>'
+            )
+        else:
+            fragments["commentsExtended.xml"].append(
+                f'<w15:commentEx w15:paraId="{para_id}" w15:done="0"/>'
+            )
+        fragments["commentsIds.xml"].append(
+            f'<w16cid:commentId w16cid:paraId="{para_id}" w16cid:durableId="{durable_id}"/>'
+        )
+        fragments["commentsExtensible.xml"].append(
+            f'<w16cex:commentExtensible w16cex:durableId="{durable_id}" w16cex:dateUtc="{ts}"/>'
+        )
+        added.append({"id": comment_id, "parent": parent_id, "para_id": para_id})
+
+    for name, root_tag in COMMENT_PARTS:
+        _append_xml(doms[name], root_tag, "".join(fragments[name]))
+        _write_xml(doms[name], word / name)
     if first_comment:
-        shutil.copy(TEMPLATE_DIR / "comments.xml", comments)
         _ensure_comment_relationships(Path(unpacked_dir))
         _ensure_comment_content_types(Path(unpacked_dir))
-    _append_xml(
-        comments,
-        "w:comments",
-        COMMENT_XML.format(
-            id=comment_id,
-            author=author,
-            date=ts,
-            initials=initials,
-            para_id=para_id,
-            text=text,  
-        ),
-    )
 
-    ext = word / "commentsExtended.xml"
-    if not ext.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsExtended.xml", ext)
-    if parent_id is not None:
-        parent_para = _find_para_id(comments, parent_id)
-        if not parent_para:
-            return "", f"Error: Parent comment {parent_id} not found"
-        _append_xml(
-            ext,
-            "w15:commentsEx",
-            f'<w15:commentEx w15:paraId="{para_id}" w15:paraIdParent="{parent_para}" w15:done="0"/>',
-        )
-    else:
-        _append_xml(
-            ext,
-            "w15:commentsEx",
-            f'<w15:commentEx w15:paraId="{para_id}" w15:done="0"/>',
-        )
+    replies = sum(1 for a in added if a["parent"] is not None)
+    return added, f"Added {len(added) - replies} comments and {replies} replies"
 
-    ids = word / "commentsIds.xml"
-    if not ids.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsIds.xml", ids)
-    _append_xml(
-        ids,
-        "w16cid:commentsIds",
-        f'<w16cid:commentId w16cid:paraId="{para_id}" w16cid:durableId="{durable_id}"/>',
-    )
 
-    extensible = word / "commentsExtensible.xml"
-    if not extensible.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsExtensible.xml", extensible)
-    _append_xml(
-        extensible,
-        "w16cex:commentsExtensible",
-        f'<w16cex:commentExtensible w16cex:durableId="{durable_id}" w16cex:dateUtc="{ts}"/>',
+def add_comment(
+    unpacked_dir: str,
+    comment_id: int,
+    text: str,
+    author: str = "Claude",
+    initials: str = "C",
+    parent_id: int | None = None,
+) -> tuple[str, str]:
+    added, message = add_comments(
+        unpacked_dir,
+        [
+            {
+                "id": comment_id,
+                "text": text,
+                "author": author,
+                "initials": initials,
+                "parent": parent_id,
+            }
+        ],
     )
+    if not added:
+        return "", message
 
+    para_id = added[0]["para_id"]
     action = "reply" if parent_id is not None else "comment"
     return para_id, f"Added {action} {comment_id} (para_id={para_id})"
 
 
+def _print_markers(comment_id: int, parent_id: int | None) -> None:
+    if parent_id is not None:
+        print(REPLY_MARKER_TEMPLATE.format(pid=parent_id, cid=comment_id))
+    else:
+        print(COMMENT_MARKER_TEMPLATE.format(cid=comment_id))
+
+
 if __name__ == "__main__":
     p = argparse.ArgumentParser(description="Add comments to DOCX documents")
     p.add_argument("unpacked_dir", help="Unpacked DOCX directory")
-    p.add_argument("comment_id", type=int, help="Comment ID (must be unique)")
-    p.add_argument("text", help="Comment text")
+    p.add_argument("comment_id", type=int, nargs="?", help="Comment ID (must be unique)")
+    p.add_argument("text", nargs="?", help="Comment text")
     p.add_argument("--author", default="Claude", help="Author name")
     p.add_argument("--initials", default="C", help="Author initials")
     p.add_argument("--parent", type=int, help="Parent comment ID (for replies)")
+    p.add_argument("--batch", help="JSON file with a list of comments and replies")
     args = p.parse_args()
 
+    if args.batch:
+        entries = json.loads(Path(args.batch).read_text(encoding="utf-8"))
+        for entry in entries if isinstance(entries, list) else []:
+            if isinstance(entry, dict):
+                entry.setdefault("author", args.author)
+                entry.setdefault("initials", args.initials)
+        added, msg = add_comments(args.unpacked_dir, entries)
+        print(msg)
+        if "Error" in msg:
+            sys.exit(1)
+        for a in added:
+            _print_markers(a["id"], a["parent"])
+        sys.exit(0)
+
+    if args.comment_id is None or args.text is None:
+        p.error("comment_id and text are required unless --batch is given")
+
     para_id, msg = add_comment(
         args.unpacked_dir,
         args.comment_id,
@@ -311,8 +445,4 @@ if __name__ == "__main__":
     print(msg)
     if "Error" in msg:
         sys.exit(1)
-    cid = args.comment_id
-    if args.parent is not None:
-        print(REPLY_MARKER_TEMPLATE.format(pid=args.parent, cid=cid))
-    else:
-        print(COMMENT_MARKER_TEMPLATE.format(cid=cid))
+    _print_markers(args.comment_id, args.parent)
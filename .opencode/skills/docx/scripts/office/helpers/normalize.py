@@ -0,0 +1,68 @@
+"""Normalize runs and tracked changes in DOCX with a single parse.
+
+Combines simplify_redlines and merge_runs: word/document.xml is parsed once
+with lxml, walked once (iteratively, so deeply nested tables cannot hit the
+recursion limit), and serialized once. The result is the same document that
+running simplify_redlines followed by merge_runs produces.
+"""
+
+from pathlib import Path
+
+import lxml.etree
+
+from .merge_runs import merge_runs_in_tree
+from .simplify_redlines import simplify_redlines_in_tree
+
+XML_DECLARATION = b'<?xml version="1.0" encoding="UTF-8"?>'
+
+
+def normalize_document(
+    input_dir: str,
+    merge_runs: bool = True,
+    simplify_redlines: bool = True,
+) -> tuple[int, int, str]:
+    doc_xml = Path(input_dir) / "word" / "document.xml"
+
+    if not doc_xml.exists():
+        return 0, 0, f"Error: {doc_xml} not found"
+
+    try:
+        tree = parse_document(doc_xml)
+
+        tracked_containers, runs, proof_errs = [], [], []
+        for elem in tree.getroot().iter(lxml.etree.Element):
+            name = elem.tag.rpartition("}")[2]
+            if name == "r":
+                runs.append(elem)
+            elif name in ("p", "tc"):
+                tracked_containers.append(elem)
+            elif name == "proofErr":
+                proof_errs.append(elem)
+
+        simplify_count = 0
+        if simplify_redlines:
+            simplify_count = simplify_redlines_in_tree(tracked_containers)
+
+        merge_count = 0
+        if merge_runs:
+            merge_count = merge_runs_in_tree(runs, proof_errs)
+
+        doc_xml.write_bytes(XML_DECLARATION + lxml.etree.tostring(tree, encoding="UTF-8"))
+        return (
+            merge_count,
+            simplify_count,
+            f"Simplified {simplify_count} tracked changes, merged {merge_count} runs",
+        )
+
+    except Exception as e:
+        return 0, 0, f"Error: {e}"
+
+
+def parse_document(doc_xml: Path):
+    parser = lxml.etree.XMLParser(
+        huge_tree=True,
+        resolve_entities=False,
+        no_network=True,
+        strip_cdata=False,
+    )
+    return lxml.etree.parse(str(doc_xml), parser)
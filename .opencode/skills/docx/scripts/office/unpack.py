@@ -4,6 +4,14 @@ Extracts the ZIP archive, pretty-prints XML files, and optionally:
 - Merges adjacent runs with identical formatting (DOCX only)
 - Simplifies adjacent tracked changes from same author (DOCX only)
 
+With --parts, only ZIP members matching the given globs are extracted and
+pretty-printed. A manifest records the source file so pack.py can take every
+other part straight from the original archive.
+
+With --cache-dir, the normalized tree is cached under the SHA-256 of the input
+and the unpack options; repeated unpacks of the same file copy the cached tree
+instead of extracting, pretty-printing and merging again.
+
 Usage:
     python unpack.py <office_file> <output_dir> [options]
 
@@ -11,17 +19,31 @@ Examples:
     python unpack.py document.docx unpacked/
     python unpack.py presentation.pptx unpacked/
     python unpack.py document.docx unpacked/ --merge-runs false
+    python unpack.py document.docx unpacked/ --parts word/document.xml
+    python unpack.py presentation.pptx unpacked/ --parts "ppt/slides/slide[12].xml"
+    python unpack.py template.docx unpacked/ --cache-dir
 """
 
 import argparse
+import fnmatch
+import json
 import sys
 import zipfile
 from pathlib import Path
 
 import defusedxml.minidom
 
-from helpers.merge_runs import merge_runs as do_merge_runs
-from helpers.simplify_redlines import simplify_redlines as do_simplify_redlines
+from cache import (
+    DEFAULT_CACHE_DIR,
+    cache_key,
+    data_dir,
+    file_digest,
+    lookup,
+    materialize,
+    read_meta,
+    store,
+)
+from helpers.normalize import normalize_document
 
 SMART_QUOTE_REPLACEMENTS = {
     "\u201c": "&#x201C;",  
@@ -30,12 +52,25 @@ SMART_QUOTE_REPLACEMENTS = {
     "\u2019": "&#x2019;",  
 }
 
+PARTS_MANIFEST = ".unpack-parts.json"
+DEFAULT_CACHE_MAX_MB = 1024
+# Bump whenever normalization, run merging, redline simplification or
+# pretty-printing changes the unpacked tree.
+UNPACK_CACHE_VERSION = 1
+
+
+class NoMatchingParts(Exception):
+    pass
+
 
 def unpack(
     input_file: str,
     output_directory: str,
     merge_runs: bool = True,
     simplify_redlines: bool = True,
+    parts: list[str] | None = None,
+    cache_dir: str | None = None,
+    cache_max_mb: int = DEFAULT_CACHE_MAX_MB,
 ) -> tuple[None, str]:
     input_path = Path(input_file)
     output_path = Path(output_directory)
@@ -48,35 +83,142 @@ def unpack(
         return None, f"Error: {input_file} must be a .docx, .pptx, or .xlsx file"
 
     try:
-        output_path.mkdir(parents=True, exist_ok=True)
+        if cache_dir is None:
+            details = _unpack_into(
+                input_path, output_path, suffix, merge_runs, simplify_redlines, parts
+            )
+        else:
+            details = _unpack_cached(
+                input_path,
+                output_path,
+                suffix,
+                merge_runs,
+                simplify_redlines,
+                parts,
+                Path(cache_dir),
+                cache_max_mb,
+            )
+
+        return None, f"Unpacked {input_file}{details}"
+
+    except NoMatchingParts as e:
+        return None, f"Error: {e}"
+    except zipfile.BadZipFile:
+        return None, f"Error: {input_file} is not a valid Office file"
+    except Exception as e:
+        return None, f"Error unpacking: {e}"
+
 
-        with zipfile.ZipFile(input_path, "r") as zf:
+def _unpack_into(
+    input_path: Path,
+    output_path: Path,
+    suffix: str,
+    merge_runs: bool,
+    simplify_redlines: bool,
+    parts: list[str] | None,
+) -> str:
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    with zipfile.ZipFile(input_path, "r") as zf:
+        if parts:
+            members = _select_members(zf.namelist(), parts)
+            if not members:
+                raise NoMatchingParts(f"No parts in {input_path} match {', '.join(parts)}")
+            zf.extractall(output_path, members)
+            _write_parts_manifest(output_path, input_path, parts, members)
+        else:
             zf.extractall(output_path)
 
-        xml_files = list(output_path.rglob("*.xml")) + list(output_path.rglob("*.rels"))
-        for xml_file in xml_files:
-            _pretty_print_xml(xml_file)
+    xml_files = list(output_path.rglob("*.xml")) + list(output_path.rglob("*.rels"))
+    for xml_file in xml_files:
+        _pretty_print_xml(xml_file)
 
-        message = f"Unpacked {input_file} ({len(xml_files)} XML files)"
+    details = f" ({len(xml_files)} XML files)"
 
-        if suffix == ".docx":
-            if simplify_redlines:
-                simplify_count, _ = do_simplify_redlines(str(output_path))
-                message += f", simplified {simplify_count} tracked changes"
+    if suffix == ".docx" and (simplify_redlines or merge_runs):
+        merge_count, simplify_count, _ = normalize_document(
+            str(output_path),
+            merge_runs=merge_runs,
+            simplify_redlines=simplify_redlines,
+        )
+        if simplify_redlines:
+            details += f", simplified {simplify_count} tracked changes"
+        if merge_runs:
+            details += f", merged {merge_count} runs"
 
-            if merge_runs:
-                merge_count, _ = do_merge_runs(str(output_path))
-                message += f", merged {merge_count} runs"
+    for xml_file in xml_files:
+        _escape_smart_quotes(xml_file)
 
-        for xml_file in xml_files:
-            _escape_smart_quotes(xml_file)
+    return details
 
-        return None, message
 
-    except zipfile.BadZipFile:
-        return None, f"Error: {input_file} is not a valid Office file"
-    except Exception as e:
-        return None, f"Error unpacking: {e}"
+def _unpack_cached(
+    input_path: Path,
+    output_path: Path,
+    suffix: str,
+    merge_runs: bool,
+    simplify_redlines: bool,
+    parts: list[str] | None,
+    cache_dir: Path,
+    cache_max_mb: int,
+) -> str:
+    key = cache_key(
+        "unpack",
+        UNPACK_CACHE_VERSION,
+        file_digest(input_path),
+        suffix,
+        merge_runs,
+        simplify_redlines,
+        sorted(parts or []),
+    )
+
+    entry = lookup(cache_dir, key)
+    cached = entry is not None
+    if not cached:
+
+        def populate(tree: Path) -> dict:
+            details = _unpack_into(
+                input_path, tree, suffix, merge_runs, simplify_redlines, parts
+            )
+            return {"details": details}
+
+        entry = store(cache_dir, key, populate, max_bytes=cache_max_mb * 1024 * 1024)
+
+    try:
+        details = read_meta(entry)["details"]
+        materialize(data_dir(entry), output_path)
+    except (OSError, KeyError, ValueError):
+        # Evicted by another process while being copied out.
+        return _unpack_into(input_path, output_path, suffix, merge_runs, simplify_redlines, parts)
+
+    manifest_path = output_path / PARTS_MANIFEST
+    if parts and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        _write_parts_manifest(output_path, input_path, parts, manifest["members"])
+
+    return f"{details} (cached)" if cached else details
+
+
+def _select_members(names: list[str], patterns: list[str]) -> list[str]:
+    return [
+        name
+        for name in names
+        if not name.endswith("/")
+        and any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+    ]
+
+
+def _write_parts_manifest(
+    output_path: Path, input_path: Path, patterns: list[str], members: list[str]
+) -> None:
+    manifest = {
+        "source": str(input_path.resolve()),
+        "parts": patterns,
+        "members": members,
+    }
+    (output_path / PARTS_MANIFEST).write_text(
+        json.dumps(manifest, indent=2), encoding="utf-8"
+    )
 
 
 def _pretty_print_xml(xml_file: Path) -> None:
@@ -118,6 +260,26 @@ if __name__ == "__main__":
         metavar="true|false",
         help="Merge adjacent tracked changes from same author (DOCX only, default: true)",
     )
+    parser.add_argument(
+        "--parts",
+        nargs="+",
+        metavar="GLOB",
+        help="Only extract ZIP members matching these globs (e.g. word/document.xml); "
+        "pack.py restores the rest from the original file",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const=str(DEFAULT_CACHE_DIR),
+        metavar="DIR",
+        help=f"Reuse unpacked trees cached by input hash (default dir: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"Evict least recently used cache entries above this size (default: {DEFAULT_CACHE_MAX_MB})",
+    )
     args = parser.parse_args()
 
     _, message = unpack(
@@ -125,6 +287,9 @@ if __name__ == "__main__":
         args.output_directory,
         merge_runs=args.merge_runs,
         simplify_redlines=args.simplify_redlines,
+        parts=args.parts,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
     )
     print(message)
 
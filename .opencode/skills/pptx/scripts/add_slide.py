@@ -5,6 +5,8 @@ Usage: python add_slide.py <unpacked_dir> <source>
 The source can be:
   - A slide file (e.g., slide2.xml) - duplicates the slide
   - A layout file (e.g., slideLayout2.xml) - creates from layout
+  - A layout name (e.g., "Title and Content") - creates from that layout,
+    looked up in the cached template inventory (see inventory.py)
 
 Examples:
     python add_slide.py unpacked/ slide2.xml
@@ -13,39 +15,59 @@ Examples:
     python add_slide.py unpacked/ slideLayout2.xml
     # Creates slide5.xml from slideLayout2.xml
 
-To see available layouts: ls unpacked/ppt/slideLayouts/
+To see available layouts: python inventory.py unpacked/
 
 Prints the <p:sldId> element to add to presentation.xml.
+
+Batch mode applies a JSON plan of operations in one go: shared parts
+([Content_Types].xml, presentation.xml and its .rels) are read and written
+once, <p:sldIdLst> is updated automatically, and nothing is written unless
+the whole plan is valid.
+
+    python add_slide.py unpacked/ --plan plan.json
+
+    [
+      {"op": "duplicate", "source": "slide2.xml", "as": "intro"},
+      {"op": "create", "layout": "Title and Content", "as": "agenda"},
+      {"op": "delete", "slide": "slide3.xml"},
+      {"op": "order", "slides": ["intro", "agenda", "slide1.xml"]}
+    ]
+
+"layout" takes a file name or a layout name. "as" names a new slide so later
+operations can refer to it. Slides missing from an "order" list keep their
+relative order after the listed ones.
+Deleted slides leave their files behind; run clean.py afterwards.
 """
 
+import json
+import os
 import re
 import shutil
 import sys
+import tempfile
 from pathlib import Path
 
-
-def get_next_slide_number(slides_dir: Path) -> int:
-    existing = [int(m.group(1)) for f in slides_dir.glob("slide*.xml")
-                if (m := re.match(r"slide(\d+)\.xml", f.name))]
-    return max(existing) + 1 if existing else 1
-
-
-def create_slide_from_layout(unpacked_dir: Path, layout_file: str) -> None:
-    slides_dir = unpacked_dir / "ppt" / "slides"
-    rels_dir = slides_dir / "_rels"
-    layouts_dir = unpacked_dir / "ppt" / "slideLayouts"
-
-    layout_path = layouts_dir / layout_file
-    if not layout_path.exists():
-        print(f"Error: {layout_path} not found", file=sys.stderr)
-        sys.exit(1)
-
-    next_num = get_next_slide_number(slides_dir)
-    dest = f"slide{next_num}.xml"
-    dest_slide = slides_dir / dest
-    dest_rels = rels_dir / f"{dest}.rels"
-
-    slide_xml = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+from inventory import find_layout, load_inventory
+from package import (
+    CONTENT_TYPES,
+    CT_NS,
+    P_NS,
+    PRESENTATION,
+    R_NS,
+    RELS_NS,
+    parse_rels,
+    parse_xml,
+    rels_part,
+    serialize,
+)
+
+SLIDE_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+SLIDE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+LAYOUT_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slideLayout"
+FIRST_SLIDE_ID = 256
+MAX_SLIDE_ID = 2147483647
+
+EMPTY_SLIDE_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <p:sld xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main">
   <p:cSld>
     <p:spTree>
@@ -68,7 +90,30 @@ def create_slide_from_layout(unpacked_dir: Path, layout_file: str) -> None:
     <a:masterClrMapping/>
   </p:clrMapOvr>
 </p:sld>'''
-    dest_slide.write_text(slide_xml, encoding="utf-8")
+
+
+def get_next_slide_number(slides_dir: Path) -> int:
+    existing = [int(m.group(1)) for f in slides_dir.glob("slide*.xml")
+                if (m := re.match(r"slide(\d+)\.xml", f.name))]
+    return max(existing) + 1 if existing else 1
+
+
+def create_slide_from_layout(unpacked_dir: Path, layout_file: str) -> None:
+    slides_dir = unpacked_dir / "ppt" / "slides"
+    rels_dir = slides_dir / "_rels"
+    layouts_dir = unpacked_dir / "ppt" / "slideLayouts"
+
+    layout_path = layouts_dir / layout_file
+    if not layout_path.exists():
+        print(f"Error: {layout_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    next_num = get_next_slide_number(slides_dir)
+    dest = f"slide{next_num}.xml"
+    dest_slide = slides_dir / dest
+    dest_rels = rels_dir / f"{dest}.rels"
+
+    dest_slide.write_text(EMPTY_SLIDE_XML, encoding="utf-8")
 
     rels_dir.mkdir(exist_ok=True)
     rels_xml = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
@@ -162,22 +207,279 @@ def _get_next_slide_id(unpacked_dir: Path) -> int:
     return max(slide_ids) + 1 if slide_ids else 256
 
 
+class SlideBatch:
+
+    def __init__(self, unpacked_dir: Path):
+        self.root = unpacked_dir
+        self.content_types = parse_xml((unpacked_dir / CONTENT_TYPES).read_bytes())
+        self.presentation = parse_xml((unpacked_dir / PRESENTATION).read_bytes())
+        self.pres_rels = parse_xml((unpacked_dir / rels_part(PRESENTATION)).read_bytes())
+        self.files: dict[str, bytes] = {}
+        self.aliases: dict[str, str] = {}
+        self.results: list[str] = []
+        self.inventory: dict | None = None
+
+        self.targets = {
+            rel["id"]: rel["target"]
+            for rel in parse_rels(
+                (unpacked_dir / rels_part(PRESENTATION)).read_bytes(), PRESENTATION
+            )
+        }
+        rids = [int(m.group(1)) for rid in self.targets if (m := re.fullmatch(r"rId(\d+)", rid))]
+        self.next_rid = max(rids, default=0) + 1
+        ids = [int(el.get("id")) for el in self.sld_id_lst().iter(f"{{{P_NS}}}sldId")]
+        self.next_id = max(ids, default=FIRST_SLIDE_ID - 1) + 1
+        self.next_number = get_next_slide_number(unpacked_dir / "ppt" / "slides")
+
+    def sld_id_lst(self):
+        lst = self.presentation.find(f"{{{P_NS}}}sldIdLst")
+        if lst is None:
+            lst = self.presentation.makeelement(f"{{{P_NS}}}sldIdLst")
+            anchor = None
+            for name in ("sldMasterIdLst", "notesMasterIdLst", "handoutMasterIdLst"):
+                found = self.presentation.find(f"{{{P_NS}}}{name}")
+                if found is not None:
+                    anchor = found
+            if anchor is None:
+                self.presentation.insert(0, lst)
+            else:
+                anchor.addnext(lst)
+        return lst
+
+    def resolve(self, name: str) -> str:
+        name = self.aliases.get(name, name)
+        part = f"ppt/slides/{name}"
+        if part not in self.files and not (self.root / part).is_file():
+            raise ValueError(f"Slide not found: {name}")
+        return name
+
+    def read(self, part: str) -> bytes | None:
+        if part in self.files:
+            return self.files[part]
+        path = self.root / part
+        return path.read_bytes() if path.is_file() else None
+
+    def add_slide(self, slide_xml: bytes, rels_xml: bytes, alias: str | None) -> str:
+        if self.next_id > MAX_SLIDE_ID:
+            raise ValueError("No slide IDs left in presentation.xml")
+        name = f"slide{self.next_number}.xml"
+        self.next_number += 1
+        part = f"ppt/slides/{name}"
+        self.files[part] = slide_xml
+        self.files[rels_part(part)] = rels_xml
+
+        override = self.content_types.makeelement(
+            f"{{{CT_NS}}}Override", PartName=f"/{part}", ContentType=SLIDE_CONTENT_TYPE
+        )
+        self.content_types.append(override)
+
+        rid = f"rId{self.next_rid}"
+        self.next_rid += 1
+        rel = self.pres_rels.makeelement(
+            f"{{{RELS_NS}}}Relationship", Id=rid, Type=SLIDE_REL_TYPE, Target=f"slides/{name}"
+        )
+        self.pres_rels.append(rel)
+        self.targets[rid] = part
+
+        sld_id = self.presentation.makeelement(f"{{{P_NS}}}sldId")
+        sld_id.set("id", str(self.next_id))
+        sld_id.set(f"{{{R_NS}}}id", rid)
+        self.next_id += 1
+        self.sld_id_lst().append(sld_id)
+
+        if alias:
+            if alias in self.aliases:
+                raise ValueError(f"Duplicate alias: {alias}")
+            self.aliases[alias] = name
+        return name
+
+    def duplicate(self, source: str, alias: str | None = None) -> str:
+        source = self.resolve(source)
+        part = f"ppt/slides/{source}"
+        rels = self.read(rels_part(part))
+        if rels is not None:
+            root = parse_xml(rels)
+            for rel in list(root):
+                if rel.get("Type", "").endswith("/notesSlide"):
+                    root.remove(rel)
+            rels = serialize(root)
+        else:
+            rels = serialize(parse_xml(f'<Relationships xmlns="{RELS_NS}"/>'.encode()))
+        name = self.add_slide(self.read(part), rels, alias)
+        self.results.append(f"Created {name} from {source}")
+        return name
+
+    def create(self, layout: str, alias: str | None = None) -> str:
+        if not layout.endswith(".xml") and self.inventory is None:
+            self.inventory = load_inventory(self.root)
+        layout = resolve_layout(self.root, layout, self.inventory)
+        if not (self.root / "ppt" / "slideLayouts" / layout).is_file():
+            raise ValueError(f"Layout not found: {layout}")
+        rels = (
+            f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{RELS_NS}">\n'
+            f'  <Relationship Id="rId1" Type="{LAYOUT_REL_TYPE}" Target="../slideLayouts/{layout}"/>\n'
+            f"</Relationships>"
+        )
+        name = self.add_slide(EMPTY_SLIDE_XML.encode(), rels.encode(), alias)
+        self.results.append(f"Created {name} from {layout}")
+        return name
+
+    def sld_ids(self) -> dict[str, object]:
+        by_name = {}
+        for sld_id in self.sld_id_lst().iter(f"{{{P_NS}}}sldId"):
+            target = self.targets.get(sld_id.get(f"{{{R_NS}}}id"), "")
+            by_name[target.rpartition("/")[2]] = sld_id
+        return by_name
+
+    def delete(self, slide: str) -> None:
+        name = self.resolve(slide)
+        sld_id = self.sld_ids().get(name)
+        if sld_id is None:
+            raise ValueError(f"Slide is not in sldIdLst: {name}")
+        rid = sld_id.get(f"{{{R_NS}}}id")
+        sld_id.getparent().remove(sld_id)
+        for rel in list(self.pres_rels):
+            if rel.get("Id") == rid:
+                self.pres_rels.remove(rel)
+        self.results.append(f"Deleted {name}")
+
+    def order(self, slides: list[str]) -> None:
+        by_name = self.sld_ids()
+        wanted = [self.resolve(slide) for slide in slides]
+        missing = [name for name in wanted if name not in by_name]
+        if missing:
+            raise ValueError(f"Slides not in sldIdLst: {', '.join(missing)}")
+        if len(set(wanted)) != len(wanted):
+            raise ValueError("Slide listed twice in order")
+        lst = self.sld_id_lst()
+        listed = set(wanted)
+        rest = [el for name, el in by_name.items() if name not in listed]
+        for el in [by_name[name] for name in wanted] + rest:
+            lst.append(el)
+        self.results.append(f"Reordered {len(wanted)} slides")
+
+    def commit(self) -> None:
+        outputs = dict(self.files)
+        outputs[CONTENT_TYPES] = serialize(self.content_types)
+        outputs[rels_part(PRESENTATION)] = serialize(self.pres_rels)
+        outputs[PRESENTATION] = serialize(self.presentation)
+
+        # mkstemp creates 0600 files; keep existing modes and give new files
+        # the usual umask default.
+        umask = os.umask(0)
+        os.umask(umask)
+        staged = []
+        try:
+            for part, data in outputs.items():
+                path = self.root / part
+                path.parent.mkdir(parents=True, exist_ok=True)
+                fd, temp_name = tempfile.mkstemp(prefix=".add_slide-", dir=path.parent)
+                staged.append((temp_name, path))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                    try:
+                        mode = path.stat().st_mode & 0o7777
+                    except FileNotFoundError:
+                        mode = 0o666 & ~umask
+                    os.fchmod(f.fileno(), mode)
+        except BaseException:
+            for temp_name, _ in staged:
+                Path(temp_name).unlink(missing_ok=True)
+            raise
+        for temp_name, path in staged:
+            os.replace(temp_name, path)
+
+
+PLAN_FIELDS = {"duplicate": "source", "create": "layout", "delete": "slide", "order": "slides"}
+
+
+def _validate_plan(plan) -> None:
+    if not isinstance(plan, list):
+        raise ValueError("Plan must be a list of steps")
+    for index, step in enumerate(plan):
+        if not isinstance(step, dict):
+            raise ValueError(f"Plan step {index} must be an object")
+        op = step.get("op")
+        if op not in PLAN_FIELDS:
+            raise ValueError(f"Plan step {index}: unknown operation {op!r}")
+        field = PLAN_FIELDS[op]
+        value = step.get(field)
+        if op == "order":
+            if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+                raise ValueError(f'Plan step {index}: "slides" must be a list of slide names')
+        elif not isinstance(value, str):
+            raise ValueError(f'Plan step {index}: "{field}" must be a string')
+        if step.get("as") is not None and not isinstance(step["as"], str):
+            raise ValueError(f'Plan step {index}: "as" must be a string')
+
+
+def apply_plan(unpacked_dir: Path, plan: list[dict]) -> list[str]:
+    _validate_plan(plan)
+    batch = SlideBatch(unpacked_dir)
+    for step in plan:
+        op = step["op"]
+        if op == "duplicate":
+            batch.duplicate(step["source"], step.get("as"))
+        elif op == "create":
+            batch.create(step["layout"], step.get("as"))
+        elif op == "delete":
+            batch.delete(step["slide"])
+        else:
+            batch.order(step["slides"])
+    batch.commit()
+    return batch.results
+
+
+def resolve_layout(unpacked_dir: Path, layout: str, inventory: dict | None = None) -> str:
+    if layout.endswith(".xml"):
+        return layout
+    if inventory is None:
+        inventory = load_inventory(unpacked_dir)
+    found = find_layout(inventory, layout)
+    if found is None:
+        raise ValueError(f"No layout named {layout!r}")
+    return found["file"]
+
+
 def parse_source(source: str) -> tuple[str, str | None]:
     if source.startswith("slideLayout") and source.endswith(".xml"):
         return ("layout", source)
+    if not source.endswith(".xml"):
+        return ("layout", None)
 
     return ("slide", None)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[2] == "--plan":
+        unpacked_dir = Path(sys.argv[1])
+        if not unpacked_dir.exists():
+            print(f"Error: {unpacked_dir} not found", file=sys.stderr)
+            sys.exit(1)
+        try:
+            plan_text = sys.stdin.read() if sys.argv[3] == "-" else Path(sys.argv[3]).read_text()
+            results = apply_plan(unpacked_dir, json.loads(plan_text))
+        except KeyError as e:
+            print(f"Error: plan step is missing {e}", file=sys.stderr)
+            sys.exit(1)
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        for line in results:
+            print(line)
+        sys.exit(0)
+
     if len(sys.argv) != 3:
         print("Usage: python add_slide.py <unpacked_dir> <source>", file=sys.stderr)
+        print("       python add_slide.py <unpacked_dir> --plan <plan.json|->", file=sys.stderr)
         print("", file=sys.stderr)
         print("Source can be:", file=sys.stderr)
         print("  slide2.xml        - duplicate an existing slide", file=sys.stderr)
         print("  slideLayout2.xml  - create from a layout template", file=sys.stderr)
+        print('  "Title Only"      - create from the layout with that name', file=sys.stderr)
         print("", file=sys.stderr)
-        print("To see available layouts: ls <unpacked_dir>/ppt/slideLayouts/", file=sys.stderr)
+        print("To see available layouts: python inventory.py <unpacked_dir>", file=sys.stderr)
         sys.exit(1)
 
     unpacked_dir = Path(sys.argv[1])
@@ -188,6 +490,12 @@ if __name__ == "__main__":
         sys.exit(1)
 
     source_type, layout_file = parse_source(source)
+    if source_type == "layout" and layout_file is None:
+        try:
+            layout_file = resolve_layout(unpacked_dir, source)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
 
     if source_type == "layout" and layout_file is not None:
         create_slide_from_layout(unpacked_dir, layout_file)
@@ -1,11 +1,15 @@
 """Remove unreferenced files from an unpacked PPTX directory.
 
-Usage: python clean.py <unpacked_dir>
+Usage: python clean.py <unpacked_dir> [--dry-run]
 
 Example:
     python clean.py unpacked/
+    python clean.py unpacked/ --dry-run   # only list what would be removed
 
-This script removes:
+Works as a mark-and-sweep collector: every .rels file is read once to build
+the relationship graph, everything reachable from _rels/.rels is marked
+(slides only through <p:sldIdLst>), and the unmarked parts under ppt/ are
+swept together with their .rels files. This removes:
 - Orphaned slides (not in sldIdLst) and their relationships
 - [trash] directory (unreferenced files)
 - Orphaned .rels files for deleted resources
@@ -13,273 +17,154 @@ This script removes:
 - Unreferenced theme files
 - Unreferenced notes slides
 - Content-Type overrides for deleted files
+
+presentation.xml.rels and [Content_Types].xml are rewritten at most once.
 """
 
+import argparse
+import posixpath
 import sys
 from pathlib import Path
 
-import defusedxml.minidom
-
-
-import re
-
-
-def get_slides_in_sldidlst(unpacked_dir: Path) -> set[str]:
-    pres_path = unpacked_dir / "ppt" / "presentation.xml"
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-
-    if not pres_path.exists() or not pres_rels_path.exists():
+import lxml.etree
+from package import (
+    CONTENT_TYPES,
+    P_NS,
+    PRESENTATION,
+    R_NS,
+    drop_overrides,
+    drop_relationships,
+    parse_rels,
+    parse_xml,
+    rels_part,
+)
+
+TRASH_DIR = "[trash]"
+SWEEP_ROOT = "ppt/"
+
+
+def get_slide_rids(unpacked_dir: Path) -> set[str]:
+    pres_path = unpacked_dir / PRESENTATION
+    if not pres_path.exists():
         return set()
-
-    rels_dom = defusedxml.minidom.parse(str(pres_rels_path))
-    rid_to_slide = {}
-    for rel in rels_dom.getElementsByTagName("Relationship"):
-        rid = rel.getAttribute("Id")
-        target = rel.getAttribute("Target")
-        rel_type = rel.getAttribute("Type")
-        if "slide" in rel_type and target.startswith("slides/"):
-            rid_to_slide[rid] = target.replace("slides/", "")
-
-    pres_content = pres_path.read_text(encoding="utf-8")
-    referenced_rids = set(re.findall(r'<p:sldId[^>]*r:id="([^"]+)"', pres_content))
-
-    return {rid_to_slide[rid] for rid in referenced_rids if rid in rid_to_slide}
+    root = parse_xml(pres_path.read_bytes())
+    return {sld_id.get(f"{{{R_NS}}}id") for sld_id in root.iter(f"{{{P_NS}}}sldId")}
 
 
-def remove_orphaned_slides(unpacked_dir: Path) -> list[str]:
-    slides_dir = unpacked_dir / "ppt" / "slides"
-    slides_rels_dir = slides_dir / "_rels"
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-
-    if not slides_dir.exists():
+def read_rels(unpacked_dir: Path, part: str) -> list[dict]:
+    rels_path = unpacked_dir / rels_part(part)
+    if not rels_path.is_file():
         return []
-
-    referenced_slides = get_slides_in_sldidlst(unpacked_dir)
-    removed = []
-
-    for slide_file in slides_dir.glob("slide*.xml"):
-        if slide_file.name not in referenced_slides:
-            rel_path = slide_file.relative_to(unpacked_dir)
-            slide_file.unlink()
-            removed.append(str(rel_path))
-
-            rels_file = slides_rels_dir / f"{slide_file.name}.rels"
-            if rels_file.exists():
-                rels_file.unlink()
-                removed.append(str(rels_file.relative_to(unpacked_dir)))
-
-    if removed and pres_rels_path.exists():
-        rels_dom = defusedxml.minidom.parse(str(pres_rels_path))
-        changed = False
-
-        for rel in list(rels_dom.getElementsByTagName("Relationship")):
-            target = rel.getAttribute("Target")
-            if target.startswith("slides/"):
-                slide_name = target.replace("slides/", "")
-                if slide_name not in referenced_slides:
-                    if rel.parentNode:
-                        rel.parentNode.removeChild(rel)
-                        changed = True
-
-        if changed:
-            with open(pres_rels_path, "wb") as f:
-                f.write(rels_dom.toxml(encoding="utf-8"))
-
-    return removed
-
-
-def remove_trash_directory(unpacked_dir: Path) -> list[str]:
-    trash_dir = unpacked_dir / "[trash]"
-    removed = []
-
-    if trash_dir.exists() and trash_dir.is_dir():
-        for file_path in trash_dir.iterdir():
-            if file_path.is_file():
-                rel_path = file_path.relative_to(unpacked_dir)
-                removed.append(str(rel_path))
-                file_path.unlink()
-        trash_dir.rmdir()
-
-    return removed
-
-
-def get_slide_referenced_files(unpacked_dir: Path) -> set:
-    referenced = set()
-    slides_rels_dir = unpacked_dir / "ppt" / "slides" / "_rels"
-
-    if not slides_rels_dir.exists():
-        return referenced
-
-    for rels_file in slides_rels_dir.glob("*.rels"):
-        dom = defusedxml.minidom.parse(str(rels_file))
-        for rel in dom.getElementsByTagName("Relationship"):
-            target = rel.getAttribute("Target")
-            if not target:
+    return parse_rels(rels_path.read_bytes(), part)
+
+
+def mark(unpacked_dir: Path) -> tuple[set[str], set[str]]:
+    slide_rids = get_slide_rids(unpacked_dir)
+    reached = set()
+    unlisted_slides = set()
+    stack = [""]
+    while stack:
+        part = stack.pop()
+        for rel in read_rels(unpacked_dir, part):
+            target = rel["target"]
+            if rel["external"]:
                 continue
-            target_path = (rels_file.parent.parent / target).resolve()
-            try:
-                referenced.add(target_path.relative_to(unpacked_dir.resolve()))
-            except ValueError:
-                pass
-
-    return referenced
-
-
-def remove_orphaned_rels_files(unpacked_dir: Path) -> list[str]:
-    resource_dirs = ["charts", "diagrams", "drawings"]
-    removed = []
-    slide_referenced = get_slide_referenced_files(unpacked_dir)
-
-    for dir_name in resource_dirs:
-        rels_dir = unpacked_dir / "ppt" / dir_name / "_rels"
-        if not rels_dir.exists():
-            continue
-
-        for rels_file in rels_dir.glob("*.rels"):
-            resource_file = rels_dir.parent / rels_file.name.replace(".rels", "")
-            try:
-                resource_rel_path = resource_file.resolve().relative_to(unpacked_dir.resolve())
-            except ValueError:
-                continue
-
-            if not resource_file.exists() or resource_rel_path not in slide_referenced:
-                rels_file.unlink()
-                rel_path = rels_file.relative_to(unpacked_dir)
-                removed.append(str(rel_path))
-
-    return removed
-
-
-def get_referenced_files(unpacked_dir: Path) -> set:
-    referenced = set()
-
-    for rels_file in unpacked_dir.rglob("*.rels"):
-        dom = defusedxml.minidom.parse(str(rels_file))
-        for rel in dom.getElementsByTagName("Relationship"):
-            target = rel.getAttribute("Target")
-            if not target:
+            if rel["type"] == "slide":
+                # Slides are only live through sldIdLst; links from notes or
+                # hyperlinks on other slides do not keep them.
+                if part != PRESENTATION:
+                    continue
+                if rel["id"] not in slide_rids:
+                    unlisted_slides.add(target)
+                    continue
+            if target in reached or not (unpacked_dir / target).is_file():
                 continue
-            target_path = (rels_file.parent.parent / target).resolve()
-            try:
-                referenced.add(target_path.relative_to(unpacked_dir.resolve()))
-            except ValueError:
-                pass
+            reached.add(target)
+            stack.append(target)
+    return reached, unlisted_slides - reached
 
-    return referenced
 
-
-def remove_orphaned_files(unpacked_dir: Path, referenced: set) -> list[str]:
-    resource_dirs = ["media", "embeddings", "charts", "diagrams", "tags", "drawings", "ink"]
-    removed = []
-
-    for dir_name in resource_dirs:
-        dir_path = unpacked_dir / "ppt" / dir_name
-        if not dir_path.exists():
+def sweep_candidates(unpacked_dir: Path, reached: set[str]) -> list[str]:
+    unused = []
+    for path in sorted((unpacked_dir / SWEEP_ROOT).rglob("*")):
+        if not path.is_file():
             continue
+        part = path.relative_to(unpacked_dir).as_posix()
+        if part.endswith(".rels") and posixpath.basename(posixpath.dirname(part)) == "_rels":
+            directory = posixpath.dirname(posixpath.dirname(part))
+            source = posixpath.join(directory, posixpath.basename(part)[: -len(".rels")])
+            if source not in reached:
+                unused.append(part)
+        elif part not in reached:
+            unused.append(part)
+
+    trash_dir = unpacked_dir / TRASH_DIR
+    if trash_dir.is_dir():
+        unused.extend(
+            path.relative_to(unpacked_dir).as_posix()
+            for path in sorted(trash_dir.rglob("*"))
+            if path.is_file()
+        )
+    return unused
+
+
+def clean_unused_files(unpacked_dir: Path, dry_run: bool = False) -> list[str]:
+    reached, unlisted_slides = mark(unpacked_dir)
+    if PRESENTATION not in reached:
+        raise ValueError(f"{PRESENTATION} is not referenced from _rels/.rels")
+
+    removed = sweep_candidates(unpacked_dir, reached)
+    if dry_run or not removed:
+        return removed
+
+    for part in removed:
+        (unpacked_dir / part).unlink()
+    trash_dir = unpacked_dir / TRASH_DIR
+    if trash_dir.is_dir():
+        for path in sorted(trash_dir.rglob("*"), reverse=True):
+            path.rmdir()
+        trash_dir.rmdir()
 
-        for file_path in dir_path.glob("*"):
-            if not file_path.is_file():
-                continue
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
-
-    theme_dir = unpacked_dir / "ppt" / "theme"
-    if theme_dir.exists():
-        for file_path in theme_dir.glob("theme*.xml"):
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
-                theme_rels = theme_dir / "_rels" / f"{file_path.name}.rels"
-                if theme_rels.exists():
-                    theme_rels.unlink()
-                    removed.append(str(theme_rels.relative_to(unpacked_dir)))
-
-    notes_dir = unpacked_dir / "ppt" / "notesSlides"
-    if notes_dir.exists():
-        for file_path in notes_dir.glob("*.xml"):
-            if not file_path.is_file():
-                continue
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
+    pres_rels_path = unpacked_dir / rels_part(PRESENTATION)
+    if unlisted_slides and pres_rels_path.exists():
+        pres_rels_path.write_bytes(
+            drop_relationships(pres_rels_path.read_bytes(), PRESENTATION, unlisted_slides)
+        )
 
-        notes_rels_dir = notes_dir / "_rels"
-        if notes_rels_dir.exists():
-            for file_path in notes_rels_dir.glob("*.rels"):
-                notes_file = notes_dir / file_path.name.replace(".rels", "")
-                if not notes_file.exists():
-                    file_path.unlink()
-                    removed.append(str(file_path.relative_to(unpacked_dir)))
+    ct_path = unpacked_dir / CONTENT_TYPES
+    if ct_path.exists():
+        ct_path.write_bytes(drop_overrides(ct_path.read_bytes(), set(removed)))
 
     return removed
 
 
-def update_content_types(unpacked_dir: Path, removed_files: list[str]) -> None:
-    ct_path = unpacked_dir / "[Content_Types].xml"
-    if not ct_path.exists():
-        return
-
-    dom = defusedxml.minidom.parse(str(ct_path))
-    changed = False
-
-    for override in list(dom.getElementsByTagName("Override")):
-        part_name = override.getAttribute("PartName").lstrip("/")
-        if part_name in removed_files:
-            if override.parentNode:
-                override.parentNode.removeChild(override)
-                changed = True
-
-    if changed:
-        with open(ct_path, "wb") as f:
-            f.write(dom.toxml(encoding="utf-8"))
-
-
-def clean_unused_files(unpacked_dir: Path) -> list[str]:
-    all_removed = []
-
-    slides_removed = remove_orphaned_slides(unpacked_dir)
-    all_removed.extend(slides_removed)
-
-    trash_removed = remove_trash_directory(unpacked_dir)
-    all_removed.extend(trash_removed)
-
-    while True:
-        removed_rels = remove_orphaned_rels_files(unpacked_dir)
-        referenced = get_referenced_files(unpacked_dir)
-        removed_files = remove_orphaned_files(unpacked_dir, referenced)
-
-        total_removed = removed_rels + removed_files
-        if not total_removed:
-            break
-
-        all_removed.extend(total_removed)
-
-    if all_removed:
-        update_content_types(unpacked_dir, all_removed)
-
-    return all_removed
-
-
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python clean.py <unpacked_dir>", file=sys.stderr)
-        print("Example: python clean.py unpacked/", file=sys.stderr)
-        sys.exit(1)
-
-    unpacked_dir = Path(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Remove unreferenced files from an unpacked PPTX directory."
+    )
+    parser.add_argument("unpacked_dir", help="Unpacked PPTX directory")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="List the files that would be removed without removing them",
+    )
+    args = parser.parse_args()
+
+    unpacked_dir = Path(args.unpacked_dir)
 
     if not unpacked_dir.exists():
         print(f"Error: {unpacked_dir} not found", file=sys.stderr)
         sys.exit(1)
 
-    removed = clean_unused_files(unpacked_dir)
+    try:
+        removed = clean_unused_files(unpacked_dir, args.dry_run)
+    except (ValueError, OSError, lxml.etree.XMLSyntaxError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
     if removed:
-        print(f"Removed {len(removed)} unreferenced files:")
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"{verb} {len(removed)} unreferenced files:")
         for f in removed:
             print(f"  {f}")
     else:
@@ -0,0 +1,300 @@
+"""Compare the slides of two PowerPoint files.
+
+Hashes every slide together with everything it renders from (layout,
+master, theme, media, charts) straight from both packages and reports which
+slides were added, removed, moved or modified. XML is canonicalized and
+parts are identified by content rather than file name, so repacking,
+pretty-printing or renumbering files does not count as a change. Either
+input may also be an unpacked directory.
+
+Slides are matched by content and by their <p:sldId> id. "Moved" slides are
+the fewest slides whose relocation explains the new order. A modified slide
+lists what changed: "render" (anything that affects how it looks), "notes"
+or "hidden".
+
+Usage:
+    python diff.py old.pptx new.pptx [--json | --changed]
+
+Examples:
+    python diff.py original.pptx edited.pptx
+    #   ~ 3  slide3.xml   modified (render, notes)
+    #   > 5  slide9.xml   moved from 2
+    #   + 6  slide12.xml  added
+    #   - 4  slide4.xml   removed
+
+    python thumbnail.py edited.pptx changed \\
+        --slides "$(python diff.py original.pptx edited.pptx --changed)"
+    # Renders only the slides that look different (or are new)
+
+From Python, diff_slides(old, new) returns the same report as --json; its
+"render" list is a valid selection for thumbnail.slide_images().
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+import lxml.etree
+from package import MASTER_ONLY_TYPES, NON_RENDER_TYPES, P_NS, PRESENTATION, Package, parse_xml
+
+SLIDE_CHANGES = ("render", "notes", "hidden")
+STATUS_MARKS = {"added": "+", "removed": "-", "modified": "~", "moved": ">"}
+
+
+def diff_slides(old_path, new_path) -> dict:
+    with Package(old_path) as pkg:
+        old = slide_fingerprints(pkg)
+    with Package(new_path) as pkg:
+        new = slide_fingerprints(pkg)
+
+    pairs = match_slides(old, new)
+    in_order = _in_order([pairs[j] for j in sorted(pairs)])
+    moved = {j for k, j in enumerate(sorted(pairs)) if k not in in_order}
+
+    slides = []
+    for j, slide in enumerate(new):
+        entry = {
+            "status": "added",
+            "position": slide["position"],
+            "name": slide["name"],
+            "hidden": slide["hidden"],
+            "old_position": None,
+            "old_name": None,
+            "changes": [],
+        }
+        i = pairs.get(j)
+        if i is not None:
+            changes = [key for key in SLIDE_CHANGES if old[i][key] != slide[key]]
+            entry["old_position"] = old[i]["position"]
+            entry["old_name"] = old[i]["name"]
+            entry["changes"] = changes
+            entry["status"] = "modified" if changes else "moved" if j in moved else "unchanged"
+        entry["moved"] = j in moved
+        slides.append(entry)
+
+    matched = set(pairs.values())
+    for i, slide in enumerate(old):
+        if i not in matched:
+            slides.append(
+                {
+                    "status": "removed",
+                    "position": None,
+                    "name": None,
+                    "hidden": slide["hidden"],
+                    "old_position": slide["position"],
+                    "old_name": slide["name"],
+                    "changes": [],
+                    "moved": False,
+                }
+            )
+
+    return {
+        "slides": slides,
+        "added": [s["name"] for s in slides if s["status"] == "added"],
+        "removed": [s["old_name"] for s in slides if s["status"] == "removed"],
+        "moved": [s["name"] for s in slides if s["moved"]],
+        "modified": [s["name"] for s in slides if s["status"] == "modified"],
+        "render": [
+            s["name"]
+            for s in slides
+            if s["name"] is not None
+            and not s["hidden"]
+            and (s["status"] == "added" or {"render", "hidden"} & set(s["changes"]))
+        ],
+    }
+
+
+def slide_fingerprints(pkg: Package) -> list[dict]:
+    memo = {}
+    deck = _deck_digest(pkg)
+    fingerprints = []
+    for position, slide in enumerate(pkg.slides(), start=1):
+        notes = next(
+            (
+                rel["target"]
+                for rel in pkg.rels(slide["part"])
+                if rel["type"] == "notesSlide" and not rel["external"] and rel["target"] in pkg.names
+            ),
+            None,
+        )
+        fingerprints.append(
+            {
+                "position": position,
+                "name": slide["name"],
+                "id": slide["id"],
+                "hidden": slide["hidden"],
+                "render": hashlib.sha256(deck + _digest(pkg, slide["part"], memo)).hexdigest(),
+                "notes": _digest(pkg, notes, memo).hex() if notes else None,
+            }
+        )
+    return fingerprints
+
+
+def match_slides(old: list[dict], new: list[dict]) -> dict[int, int]:
+    pairs = {}
+    used = set()
+
+    def pair(j: int, i: int) -> None:
+        pairs[j] = i
+        used.add(i)
+
+    # Same id and same content, then same content (ids regenerated by the
+    # editing tool), then same id (the slide was edited in place).
+    old_by_id = {}
+    for i, slide in enumerate(old):
+        old_by_id.setdefault(slide["id"], i)
+    for j, slide in enumerate(new):
+        i = old_by_id.get(slide["id"])
+        if i is not None and old[i]["render"] == slide["render"] and i not in used:
+            pair(j, i)
+
+    by_content = {}
+    for i, slide in enumerate(old):
+        if i not in used:
+            by_content.setdefault((slide["render"], slide["notes"]), []).append(i)
+    for j, slide in enumerate(new):
+        if j in pairs:
+            continue
+        candidates = by_content.get((slide["render"], slide["notes"]))
+        while candidates and candidates[0] in used:
+            candidates.pop(0)
+        if candidates:
+            pair(j, candidates.pop(0))
+
+    for j, slide in enumerate(new):
+        i = old_by_id.get(slide["id"])
+        if j not in pairs and i is not None and i not in used:
+            pair(j, i)
+    return pairs
+
+
+def _in_order(sequence: list[int]) -> set[int]:
+    # Indices into sequence of one longest increasing subsequence.
+    tails = []
+    tail_index = []
+    previous = [None] * len(sequence)
+    for k, value in enumerate(sequence):
+        t = bisect.bisect_left(tails, value)
+        previous[k] = tail_index[t - 1] if t else None
+        if t == len(tails):
+            tails.append(value)
+            tail_index.append(k)
+        else:
+            tails[t] = value
+            tail_index[t] = k
+
+    keep = set()
+    k = tail_index[-1] if tail_index else None
+    while k is not None:
+        keep.add(k)
+        k = previous[k]
+    return keep
+
+
+def _digest(pkg: Package, part: str, memo: dict, active: frozenset = frozenset()) -> bytes:
+    digest = memo.get(part)
+    if digest is not None:
+        return digest
+
+    h = hashlib.sha256(_canonical(pkg.read(part)) if part.endswith(".xml") else pkg.read(part))
+    is_master = "/slideMasters/" in part
+    for rel in sorted(pkg.rels(part), key=lambda rel: rel["id"] or ""):
+        if rel["type"] in NON_RENDER_TYPES or (is_master and rel["type"] in MASTER_ONLY_TYPES):
+            continue
+        h.update(f"{rel['id']}\0{rel['type']}\0".encode("utf-8"))
+        target = rel["target"]
+        if rel["external"] or target not in pkg.names or target in active:
+            h.update(target.encode("utf-8"))
+        else:
+            h.update(_digest(pkg, target, memo, active | {part}))
+
+    digest = h.digest()
+    memo[part] = digest
+    return digest
+
+
+def _deck_digest(pkg: Package) -> bytes:
+    root = _strip_layout(parse_xml(pkg.read(PRESENTATION)))
+    h = hashlib.sha256()
+    for name in ("sldSz", "defaultTextStyle"):
+        element = root.find(f"{{{P_NS}}}{name}")
+        if element is not None:
+            h.update(lxml.etree.tostring(element, method="c14n"))
+    return h.digest()
+
+
+def _canonical(data: bytes) -> bytes:
+    try:
+        root = parse_xml(data)
+    except lxml.etree.XMLSyntaxError:
+        return data
+    return lxml.etree.tostring(_strip_layout(root), method="c14n")
+
+
+def _strip_layout(root):
+    # Indentation between elements; text in a:t never has element children.
+    for element in root.iter():
+        if len(element) and element.text is not None and not element.text.strip():
+            element.text = None
+        if element.tail is not None and not element.tail.strip():
+            element.tail = None
+    return root
+
+
+def print_report(report: dict) -> None:
+    changed = [s for s in report["slides"] if s["status"] != "unchanged"]
+    if not changed:
+        print("No slide changes")
+        return
+
+    width = max(len(s["name"] or s["old_name"]) for s in changed)
+    for s in changed:
+        position = s["position"] if s["position"] is not None else s["old_position"]
+        name = (s["name"] or s["old_name"]).ljust(width)
+        details = [s["status"]] if s["status"] in ("added", "removed") else []
+        if s["changes"]:
+            details.append(f"modified ({', '.join(s['changes'])})")
+        if s["moved"]:
+            details.append(f"moved from {s['old_position']}")
+        print(f"  {STATUS_MARKS[s['status']]} {position:<3} {name}  {', '.join(details)}")
+
+    print(
+        f"{len(report['added'])} added, {len(report['removed'])} removed, "
+        f"{len(report['moved'])} moved, {len(report['modified'])} modified"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the slides of two PowerPoint files.")
+    parser.add_argument("old", help="Original PowerPoint file (.pptx) or unpacked directory")
+    parser.add_argument("new", help="Edited PowerPoint file (.pptx) or unpacked directory")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    output.add_argument(
+        "--changed",
+        action="store_true",
+        help="Print the new or visibly changed slides as a thumbnail.py --slides selection",
+    )
+    args = parser.parse_args()
+
+    for path in (args.old, args.new):
+        if not Path(path).exists():
+            print(f"Error: {path} not found", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        report = diff_slides(args.old, args.new)
+    except (OSError, KeyError, zipfile.BadZipFile, lxml.etree.XMLSyntaxError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    elif args.changed:
+        print(",".join(report["render"]))
+    else:
+        print_report(report)
@@ -0,0 +1,176 @@
+"""Extract shapes and text from a PowerPoint file as JSON lines.
+
+Reads each slide straight from the .pptx with iterparse (no unpacking or
+pretty-printing) and writes one JSON object per slide, in presentation
+order:
+
+    {"slide": 3, "name": "slide7.xml", "hidden": false, "shapes": [
+        {"id": 2, "name": "Title 1", "kind": "sp",
+         "placeholder": {"type": "title", "idx": null},
+         "paragraphs": [["Quarterly ", "results"]]}]}
+
+Each paragraph is the list of its text runs ([] for an empty paragraph), so
+paragraph indices match the <a:p> elements of the shape. Shapes inside a
+group carry the group's id in "parent". Slides are parsed in parallel worker
+processes.
+
+Usage:
+    python extract.py input.pptx [--output FILE] [--search TEXT] [--workers N]
+
+Examples:
+    python extract.py deck.pptx > deck.jsonl
+    python extract.py deck.pptx --search "revenue"   # only matching shapes
+"""
+
+import argparse
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import lxml.etree
+from package import P_NS, Package
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+SHAPE_TAGS = {
+    f"{{{P_NS}}}{name}": name for name in ("sp", "pic", "graphicFrame", "grpSp", "cxnSp")
+}
+C_NV_PR = f"{{{P_NS}}}cNvPr"
+PH = f"{{{P_NS}}}ph"
+A_P = f"{{{A_NS}}}p"
+A_T = f"{{{A_NS}}}t"
+SLIDES_PER_TASK = 16
+
+
+def iter_slides(pptx_path: Path, workers: int | None = None):
+    with Package(pptx_path) as pkg:
+        slides = pkg.slides()
+    numbered = list(enumerate(slides, start=1))
+    tasks = [
+        (str(pptx_path), numbered[start:start + SLIDES_PER_TASK])
+        for start in range(0, len(numbered), SLIDES_PER_TASK)
+    ]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            yield from extract_slides(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for records in pool.map(extract_slides, tasks):
+            yield from records
+
+
+def extract_slides(task: tuple[str, list[tuple[int, dict]]]) -> list[dict]:
+    path, slides = task
+    records = []
+    with zipfile.ZipFile(path) as zf:
+        for number, slide in slides:
+            with zf.open(slide["part"]) as f:
+                shapes = extract_shapes(f)
+            records.append(
+                {
+                    "slide": number,
+                    "name": slide["name"],
+                    "hidden": slide["hidden"],
+                    "shapes": shapes,
+                }
+            )
+    return records
+
+
+def extract_shapes(source) -> list[dict]:
+    shapes = []
+    stack = []
+    paragraph = None
+    for event, el in lxml.etree.iterparse(
+        source,
+        events=("start", "end"),
+        huge_tree=True,
+        resolve_entities=False,
+        no_network=True,
+    ):
+        tag = el.tag
+        if event == "start":
+            if tag in SHAPE_TAGS:
+                shape = {
+                    "id": None,
+                    "name": None,
+                    "kind": SHAPE_TAGS[tag],
+                    "placeholder": None,
+                    "paragraphs": [],
+                }
+                if stack:
+                    shape["parent"] = stack[-1]["id"]
+                stack.append(shape)
+                shapes.append(shape)
+            elif tag == A_P and stack:
+                paragraph = []
+            continue
+
+        if not stack:
+            continue
+        shape = stack[-1]
+        if tag == C_NV_PR and shape["id"] is None:
+            shape["id"] = int(el.get("id")) if (el.get("id") or "").isdigit() else el.get("id")
+            shape["name"] = el.get("name")
+        elif tag == PH:
+            idx = el.get("idx")
+            shape["placeholder"] = {
+                "type": el.get("type", "obj"),
+                "idx": int(idx) if idx is not None and idx.isdigit() else None,
+            }
+        elif tag == A_T and paragraph is not None:
+            paragraph.append(el.text or "")
+        elif tag == A_P and paragraph is not None:
+            shape["paragraphs"].append(paragraph)
+            paragraph = None
+        elif tag in SHAPE_TAGS:
+            stack.pop()
+            el.clear()
+    return shapes
+
+
+def matches(shape: dict, needle: str) -> bool:
+    text = "\n".join("".join(runs) for runs in shape["paragraphs"])
+    return needle in text.lower() or needle in (shape["name"] or "").lower()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract shapes and text from a PowerPoint file as JSON lines."
+    )
+    parser.add_argument("input", help="Input PowerPoint file (.pptx)")
+    parser.add_argument("--output", help="Write JSON lines to this file instead of stdout")
+    parser.add_argument("--search", help="Only emit shapes whose text or name contains this")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if not input_path.exists() or input_path.suffix.lower() != ".pptx":
+        print(f"Error: Invalid PowerPoint file: {args.input}", file=sys.stderr)
+        sys.exit(1)
+
+    needle = args.search.lower() if args.search else None
+    out = sys.stdout
+    try:
+        if args.output:
+            out = open(args.output, "w", encoding="utf-8")
+        for record in iter_slides(input_path, args.workers):
+            if needle is not None:
+                record["shapes"] = [s for s in record["shapes"] if matches(s, needle)]
+                if not record["shapes"]:
+                    continue
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except (OSError, KeyError, zipfile.BadZipFile, lxml.etree.XMLSyntaxError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
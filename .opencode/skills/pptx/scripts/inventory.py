@@ -0,0 +1,247 @@
+"""Summarize the layouts, placeholders and theme of a PowerPoint template.
+
+Writes a compact JSON index of every slide layout (name, master, placeholder
+types, indices and positions in EMU, inherited from the master when the
+layout does not override them) and every theme (fonts and color scheme).
+The index is cached by a hash of the layout, master and theme parts, so
+looking up layouts in the same template again does not re-parse any XML.
+
+Usage:
+    python inventory.py <template.pptx | unpacked_dir> [--output FILE]
+
+Examples:
+    python inventory.py template.pptx
+    # Prints the JSON index
+
+    python inventory.py unpacked/ --output inventory.json
+
+From Python:
+    from inventory import find_layout, load_inventory
+
+    layout = find_layout(load_inventory("unpacked/"), "Title and Content")
+    layout["file"]  # "slideLayout2.xml"
+"""
+
+import argparse
+import hashlib
+import json
+import posixpath
+import sys
+from pathlib import Path
+
+from office.cache import DEFAULT_CACHE_DIR, cache_key, data_dir, lookup, store
+from package import P_NS, Package
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+INVENTORY_VERSION = 1
+INVENTORY_FILE = "inventory.json"
+TEMPLATE_DIRS = ("ppt/slideLayouts/", "ppt/slideMasters/", "ppt/theme/")
+
+# Layout placeholders without their own position take it from the master
+# placeholder of the same kind.
+MASTER_KIND = {"ctrTitle": "title", "subTitle": "body", "obj": "body"}
+
+
+def load_inventory(path, cache_dir=DEFAULT_CACHE_DIR) -> dict:
+    with Package(path) as pkg:
+        key = cache_key("pptx-inventory", INVENTORY_VERSION, template_digest(pkg))
+        entry = lookup(cache_dir, key)
+        if entry is not None:
+            try:
+                return json.loads((data_dir(entry) / INVENTORY_FILE).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                pass
+        inventory = build_inventory(pkg)
+
+    def populate(data: Path) -> dict:
+        (data / INVENTORY_FILE).write_text(json.dumps(inventory), encoding="utf-8")
+        return {"layouts": len(inventory["layouts"])}
+
+    try:
+        store(cache_dir, key, populate)
+    except OSError:
+        pass
+    return inventory
+
+
+def template_digest(pkg: Package) -> str:
+    h = hashlib.sha256()
+    for part in sorted(pkg.names):
+        if part.startswith(TEMPLATE_DIRS) and part.endswith(".xml"):
+            h.update(part.encode("utf-8") + b"\0")
+            h.update(pkg.part_digest(part))
+    return h.hexdigest()
+
+
+def find_layout(inventory: dict, name: str) -> dict | None:
+    position = inventory["index"].get(name.strip().lower())
+    return inventory["layouts"][position] if position is not None else None
+
+
+def build_inventory(pkg: Package) -> dict:
+    layouts = sorted(
+        (part for part in pkg.names if _is_part(part, "ppt/slideLayouts/")),
+        key=_part_number,
+    )
+    masters = {}
+    themes = {}
+    result = []
+
+    for part in layouts:
+        root = pkg.xml(part)
+        master_part = _related(pkg, part, "slideMaster")
+        if master_part is not None and master_part not in masters:
+            masters[master_part] = _master_info(pkg, master_part, themes)
+        master = masters.get(master_part, {})
+
+        placeholders = []
+        for ph in _placeholders(root):
+            if ph["position"] is None:
+                inherited = master.get("positions", {}).get(
+                    MASTER_KIND.get(ph["type"], ph["type"])
+                )
+                ph["position"] = inherited
+            placeholders.append(ph)
+
+        c_sld = root.find(f"{{{P_NS}}}cSld")
+        result.append(
+            {
+                "name": c_sld.get("name", "") if c_sld is not None else "",
+                "file": posixpath.basename(part),
+                "type": root.get("type"),
+                "master": posixpath.basename(master_part) if master_part else None,
+                "placeholders": placeholders,
+            }
+        )
+
+    index = {}
+    for position, layout in enumerate(result):
+        index.setdefault(layout["file"].lower(), position)
+        index.setdefault(layout["name"].lower(), position)
+
+    return {
+        "layouts": result,
+        "index": index,
+        "masters": [
+            {
+                "file": posixpath.basename(part),
+                "theme": info["theme"],
+                "placeholders": info["placeholders"],
+            }
+            for part, info in masters.items()
+        ],
+        "themes": themes,
+    }
+
+
+def _master_info(pkg: Package, part: str, themes: dict) -> dict:
+    placeholders = _placeholders(pkg.xml(part))
+    theme_part = _related(pkg, part, "theme")
+    theme = posixpath.basename(theme_part) if theme_part else None
+    if theme_part is not None and theme not in themes:
+        themes[theme] = _theme_info(pkg, theme_part)
+    return {
+        "theme": theme,
+        "placeholders": placeholders,
+        "positions": {
+            MASTER_KIND.get(ph["type"], ph["type"]): ph["position"]
+            for ph in placeholders
+            if ph["position"] is not None
+        },
+    }
+
+
+def _theme_info(pkg: Package, part: str) -> dict:
+    root = pkg.xml(part)
+    fonts = {}
+    for kind in ("major", "minor"):
+        latin = root.find(f".//{{{A_NS}}}{kind}Font/{{{A_NS}}}latin")
+        if latin is not None:
+            fonts[kind] = latin.get("typeface")
+
+    colors = {}
+    scheme = root.find(f".//{{{A_NS}}}clrScheme")
+    if scheme is not None:
+        for slot in scheme:
+            value = next(iter(slot), None)
+            if value is None:
+                continue
+            colors[slot.tag.rpartition("}")[2]] = value.get("lastClr") or value.get("val")
+
+    return {"name": root.get("name"), "fonts": fonts, "colors": colors}
+
+
+def _placeholders(root) -> list[dict]:
+    placeholders = []
+    for ph in root.iter(f"{{{P_NS}}}ph"):
+        shape = ph.getparent().getparent().getparent()
+        c_nv_pr = next(shape.iter(f"{{{P_NS}}}cNvPr"), None)
+        idx = ph.get("idx")
+        placeholders.append(
+            {
+                "type": ph.get("type", "obj"),
+                "idx": int(idx) if idx is not None else None,
+                "name": c_nv_pr.get("name") if c_nv_pr is not None else None,
+                "position": _position(shape),
+            }
+        )
+    return placeholders
+
+
+def _position(shape) -> list[int] | None:
+    sp_pr = shape.find(f"{{{P_NS}}}spPr")
+    if sp_pr is not None:
+        xfrm = sp_pr.find(f"{{{A_NS}}}xfrm")
+    else:
+        xfrm = shape.find(f"{{{P_NS}}}xfrm")
+    if xfrm is None:
+        return None
+    off = xfrm.find(f"{{{A_NS}}}off")
+    ext = xfrm.find(f"{{{A_NS}}}ext")
+    if off is None or ext is None:
+        return None
+    return [int(off.get("x")), int(off.get("y")), int(ext.get("cx")), int(ext.get("cy"))]
+
+
+def _related(pkg: Package, part: str, rel_type: str) -> str | None:
+    for rel in pkg.rels(part):
+        if rel["type"] == rel_type and not rel["external"] and rel["target"] in pkg.names:
+            return rel["target"]
+    return None
+
+
+def _is_part(part: str, directory: str) -> bool:
+    return part.startswith(directory) and part.endswith(".xml") and "/_rels/" not in part
+
+
+def _part_number(part: str) -> tuple[int, str]:
+    stem = posixpath.basename(part)[: -len(".xml")]
+    digits = stem[len(stem.rstrip("0123456789")):]
+    return (int(digits) if digits else 0, part)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize the layouts, placeholders and theme of a PowerPoint template."
+    )
+    parser.add_argument("input", help="Template (.pptx) or unpacked directory")
+    parser.add_argument("--output", help="Write the JSON index to this file instead of stdout")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        print(f"Error: {input_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        inventory = load_inventory(input_path)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(inventory, separators=(",", ":")), encoding="utf-8")
+        print(f"Wrote {len(inventory['layouts'])} layouts to {args.output}")
+    else:
+        print(json.dumps(inventory, indent=2))
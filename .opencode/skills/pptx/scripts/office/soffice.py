@@ -12,13 +12,76 @@ Usage:
     # Option 2 – get env dict for your own subprocess calls
     env = get_soffice_env()
     subprocess.run(["soffice", ...], env=env)
+
+    # Option 3 – convert through the worker pool when one is running
+    # (see soffice_pool.py), falling back to a one-off soffice process
+    output = convert_document("input.docx", "pdf", "out/")
+
+    # Option 4 – convert many files with a bounded number of soffice processes
+    converted, failed = convert_batch(["a.pptx", "b.pptx"], "pdf", "out/")
+
+    # Option 5 – run soffice in a private, pre-initialized profile so that
+    # concurrent jobs do not contend for one profile lock
+    with libreoffice_profile(macro=MODULE1_XBA) as profile:
+        run_soffice([f"-env:UserInstallation={profile.as_uri()}", ...])
+
+Profiles are copied from a template built once per macro (and per soffice
+installation) under LO_PROFILE_DIR. Each job claims a slot with an exclusive
+flock, so slots are reused but never shared by two running jobs.
+
+Batch conversion is also available from the command line:
+
+    python soffice.py --batch-convert pdf decks/*.pptx --outdir out/ --processes 4
+
+Converted files are cached under OFFICE_CACHE_DIR (see cache.py), keyed by
+the document's parts (excluding docProps/), the target format and the
+soffice installation. Set SOFFICE_CACHE=off to disable the cache,
+SOFFICE_POOL=off to bypass a running pool, or SOFFICE_POOL_STATE to point at
+the state file of a pool started elsewhere.
+
+The sandbox check runs once per process, and the socket shim is compiled
+once per shim version into OFFICE_CACHE_DIR/shim/. Container images can
+pre-build the shim and the default profile template with:
+
+    python soffice.py --warm-up
 """
 
+import fcntl
+import hashlib
+import itertools
+import json
 import os
+import shutil
 import socket
 import subprocess
 import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Iterator
+
+try:
+    from office.cache import (
+        DEFAULT_CACHE_DIR,
+        DEFAULT_MAX_BYTES,
+        cache_key,
+        clone_file,
+        lookup,
+        package_digest,
+        store,
+    )
+except ImportError:
+    from cache import (
+        DEFAULT_CACHE_DIR,
+        DEFAULT_MAX_BYTES,
+        cache_key,
+        clone_file,
+        lookup,
+        package_digest,
+        store,
+    )
 
 
 def get_soffice_env() -> dict:
@@ -37,10 +100,360 @@ def run_soffice(args: list[str], **kwargs) -> subprocess.CompletedProcess:
     return subprocess.run(["soffice"] + args, env=env, **kwargs)
 
 
+PROFILE_ROOT = Path(
+    os.environ.get("LO_PROFILE_DIR")
+    or Path(tempfile.gettempdir()) / f"lo_profiles-{os.getuid()}"
+)
+
+
+@contextmanager
+def libreoffice_profile(macro: str | None = None) -> Iterator[Path]:
+    template = _profile_template(macro)
+    name = template.name.removeprefix("template-")
 
-_SHIM_SO = Path(tempfile.gettempdir()) / "lo_socket_shim.so"
+    for index in itertools.count():
+        lock = open(PROFILE_ROOT / f"slot-{name}-{index}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            lock.close()
 
+    try:
+        slot = PROFILE_ROOT / f"slot-{name}-{index}"
+        if not slot.exists():
+            staging = Path(tempfile.mkdtemp(prefix=".slot-", dir=PROFILE_ROOT))
+            shutil.copytree(template, staging, symlinks=True, dirs_exist_ok=True)
+            os.rename(staging, slot)
+        (slot / "user" / ".lock").unlink(missing_ok=True)
+        yield slot
+    finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+
+def _profile_template(macro: str | None) -> Path:
+    installation = soffice_installation()
+    if installation is None:
+        raise RuntimeError("soffice not found on PATH")
+    digest = hashlib.sha256(f"{installation}:{macro or ''}".encode("utf-8")).hexdigest()[:16]
+
+    template = PROFILE_ROOT / f"template-{digest}"
+    if template.exists():
+        return template
+
+    PROFILE_ROOT.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with open(PROFILE_ROOT / f"template-{digest}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if template.exists():
+            return template
+
+        staging = Path(tempfile.mkdtemp(prefix=".template-", dir=PROFILE_ROOT))
+        try:
+            run_soffice(
+                [
+                    "--headless",
+                    f"-env:UserInstallation={staging.as_uri()}",
+                    "--terminate_after_init",
+                ],
+                capture_output=True,
+                timeout=60,
+                check=False,
+            )
+            if macro is not None:
+                macro_dir = staging / "user" / "basic" / "Standard"
+                macro_dir.mkdir(parents=True, exist_ok=True)
+                (macro_dir / "Module1.xba").write_text(macro)
+            (staging / "user" / ".lock").unlink(missing_ok=True)
+            os.rename(staging, template)
+        except subprocess.TimeoutExpired:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise RuntimeError("LibreOffice profile initialization timed out")
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    return template
+
+
+@lru_cache(maxsize=None)
+def soffice_installation() -> str | None:
+    soffice = shutil.which("soffice")
+    if soffice is None:
+        return None
+    binary = Path(soffice).resolve()
+    return f"{binary}:{binary.stat().st_mtime_ns}"
+
+
+POOL_STATE_FILE = Path(
+    os.environ.get("SOFFICE_POOL_STATE")
+    or Path(tempfile.gettempdir()) / f"soffice_pool-{os.getuid()}.json"
+)
+
+
+def pool_request(job: dict, timeout: float | None = None) -> dict | None:
+    if os.environ.get("SOFFICE_POOL", "").lower() in ("0", "off", "false"):
+        return None
+    try:
+        state = json.loads(POOL_STATE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
 
+    request = dict(job, token=state["token"])
+    if timeout is not None:
+        request["timeout"] = timeout
+    try:
+        with socket.create_connection((state["host"], state["port"]), timeout=2) as sock:
+            sock.settimeout(None if timeout is None else timeout + 5)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                line = f.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def convert_document(
+    input_file: str,
+    target_format: str,
+    outdir: str,
+    timeout: float | None = None,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+) -> Path | None:
+    input_path = Path(input_file).absolute()
+    output = Path(outdir) / f"{input_path.stem}.{target_format.partition(':')[0]}"
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    key = _conversion_key(input_path, target_format) if cache_dir else None
+    if key and _restore_conversion(cache_dir, key, output):
+        return output
+
+    response = pool_request(
+        {"op": "convert", "input": str(input_path), "format": target_format,
+         "outdir": str(Path(outdir).absolute())},
+        timeout=timeout,
+    )
+    if response is not None:
+        if not response.get("ok"):
+            return None
+    else:
+        try:
+            with libreoffice_profile() as profile:
+                run_soffice(
+                    [
+                        "--headless",
+                        f"-env:UserInstallation={profile.as_uri()}",
+                        "--convert-to",
+                        target_format,
+                        "--outdir",
+                        str(outdir),
+                        str(input_path),
+                    ],
+                    capture_output=True,
+                    timeout=timeout,
+                )
+        except (RuntimeError, subprocess.TimeoutExpired):
+            return None
+
+    if not output.exists():
+        return None
+    if key:
+        _store_conversion(cache_dir, key, output)
+    return output
+
+
+def _conversion_key(input_path: Path, target_format: str) -> str | None:
+    if os.environ.get("SOFFICE_CACHE", "").lower() in ("0", "off", "false"):
+        return None
+    installation = soffice_installation()
+    if installation is None or not input_path.is_file():
+        return None
+    return cache_key("convert", target_format, installation, package_digest(input_path))
+
+
+def _restore_conversion(cache_dir: Path, key: str, output: Path) -> bool:
+    entry = lookup(cache_dir, key)
+    if entry is None:
+        return False
+    cached = next((entry / "data").iterdir(), None)
+    if cached is None:
+        return False
+    clone_file(cached, output)
+    return True
+
+
+def _store_conversion(cache_dir: Path, key: str, output: Path) -> None:
+    try:
+        store(
+            cache_dir,
+            key,
+            lambda data: clone_file(output, data / output.name),
+            max_bytes=DEFAULT_MAX_BYTES,
+        )
+    except OSError:
+        pass
+
+
+DEFAULT_BATCH_PROCESSES = max(1, min(4, (os.cpu_count() or 2) // 2))
+MAX_BATCH_CHUNK = 50
+
+
+def convert_batch(
+    input_files: list[str],
+    target_format: str,
+    outdir: str,
+    processes: int = DEFAULT_BATCH_PROCESSES,
+    timeout: float | None = None,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+) -> tuple[dict[str, Path], dict[str, str]]:
+    extension = target_format.partition(":")[0]
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    inputs = list(dict.fromkeys(str(Path(f).absolute()) for f in input_files))
+    failures = {f: "File not found" for f in inputs if not Path(f).is_file()}
+    inputs = [f for f in inputs if f not in failures]
+    names = _batch_output_names(inputs, extension)
+
+    results = {}
+    keys = {}
+    if cache_dir:
+        for input_file in inputs:
+            key = _conversion_key(Path(input_file), target_format)
+            if key is None:
+                continue
+            if _restore_conversion(cache_dir, key, outdir / names[input_file]):
+                results[input_file] = outdir / names[input_file]
+            else:
+                keys[input_file] = key
+        inputs = [f for f in inputs if f not in results]
+
+    if pool_request({"op": "status"}) is not None:
+        chunks = [[f] for f in inputs]
+        convert = _convert_in_pool
+    else:
+        chunks = _batch_chunks(inputs, processes)
+        convert = _convert_chunk
+
+    staging = Path(tempfile.mkdtemp(prefix=".batch-", dir=outdir))
+    try:
+        workdirs = [staging / str(i) for i in range(len(chunks))]
+        with ThreadPoolExecutor(max_workers=max(1, processes)) as executor:
+            outcomes = executor.map(
+                lambda job: convert(job[0], target_format, job[1], timeout),
+                zip(chunks, workdirs),
+            )
+            for chunk, workdir, chunk_failures in zip(chunks, workdirs, outcomes):
+                failures.update(chunk_failures)
+                for input_file in chunk:
+                    produced = workdir / f"{Path(input_file).stem}.{extension}"
+                    if input_file in chunk_failures or not produced.exists():
+                        failures.setdefault(input_file, "No output produced")
+                        continue
+                    output = outdir / names[input_file]
+                    os.replace(produced, output)
+                    results[input_file] = output
+                    if input_file in keys:
+                        _store_conversion(cache_dir, keys[input_file], output)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return results, failures
+
+
+def _batch_output_names(inputs: list[str], extension: str) -> dict[str, str]:
+    taken = set()
+    names = {}
+    for input_file in inputs:
+        stem = Path(input_file).stem
+        name = f"{stem}.{extension}"
+        suffix = 2
+        while name in taken:
+            name = f"{stem}-{suffix}.{extension}"
+            suffix += 1
+        taken.add(name)
+        names[input_file] = name
+    return names
+
+
+def _batch_chunks(inputs: list[str], processes: int) -> list[list[str]]:
+    count = max(1, processes, -(-len(inputs) // MAX_BATCH_CHUNK))
+    chunks = [[] for _ in range(min(count, len(inputs)))]
+    stems = [Counter() for _ in chunks]
+    for i, input_file in enumerate(inputs):
+        stem = Path(input_file).stem
+        for offset in range(len(chunks)):
+            index = (i + offset) % len(chunks)
+            if not stems[index][stem]:
+                break
+        else:
+            chunks.append([])
+            stems.append(Counter())
+            index = len(chunks) - 1
+        chunks[index].append(input_file)
+        stems[index][stem] += 1
+    return [chunk for chunk in chunks if chunk]
+
+
+def _convert_chunk(
+    files: list[str], target_format: str, workdir: Path, timeout: float | None
+) -> dict[str, str]:
+    extension = target_format.partition(":")[0]
+    workdir.mkdir(parents=True, exist_ok=True)
+    error = None
+    try:
+        with libreoffice_profile() as profile:
+            result = run_soffice(
+                [
+                    "--headless",
+                    f"-env:UserInstallation={profile.as_uri()}",
+                    "--convert-to",
+                    target_format,
+                    "--outdir",
+                    str(workdir),
+                ]
+                + files,
+                capture_output=True,
+                text=True,
+                timeout=None if timeout is None else timeout * len(files),
+            )
+        if result.returncode != 0:
+            error = result.stderr.strip() or f"soffice exited with {result.returncode}"
+    except subprocess.TimeoutExpired:
+        error = "Timed out"
+    except (OSError, RuntimeError) as e:
+        return {f: str(e) for f in files}
+
+    missing = [f for f in files if not (workdir / f"{Path(f).stem}.{extension}").exists()]
+    if error and len(missing) > 1:
+        failures = {}
+        for f in missing:
+            failures.update(_convert_chunk([f], target_format, workdir, timeout))
+        return failures
+    return {f: error or "No output produced" for f in missing}
+
+
+def _convert_in_pool(
+    files: list[str], target_format: str, workdir: Path, timeout: float | None
+) -> dict[str, str]:
+    failures = {}
+    for f in files:
+        response = pool_request(
+            {"op": "convert", "input": f, "format": target_format, "outdir": str(workdir)},
+            timeout=timeout,
+        )
+        if response is None:
+            failures.update(_convert_chunk([f], target_format, workdir, timeout))
+        elif not response.get("ok"):
+            failures[f] = response.get("error", "Conversion failed")
+    return failures
+
+
+SHIM_DIR = DEFAULT_CACHE_DIR / "shim"
+
+
+@lru_cache(maxsize=None)
 def _needs_shim() -> bool:
     try:
         s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
@@ -50,19 +463,41 @@ def _needs_shim() -> bool:
         return True
 
 
+@lru_cache(maxsize=None)
 def _ensure_shim() -> Path:
-    if _SHIM_SO.exists():
-        return _SHIM_SO
-
-    src = Path(tempfile.gettempdir()) / "lo_socket_shim.c"
-    src.write_text(_SHIM_SOURCE)
-    subprocess.run(
-        ["gcc", "-shared", "-fPIC", "-o", str(_SHIM_SO), str(src), "-ldl"],
-        check=True,
-        capture_output=True,
-    )
-    src.unlink()
-    return _SHIM_SO
+    digest = hashlib.sha256(_SHIM_SOURCE.encode("utf-8")).hexdigest()[:16]
+    shim = SHIM_DIR / f"lo_socket_shim-{digest}.so"
+    if shim.exists():
+        return shim
+
+    SHIM_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    build_dir = Path(tempfile.mkdtemp(prefix=".build-", dir=SHIM_DIR))
+    try:
+        src = build_dir / "lo_socket_shim.c"
+        src.write_text(_SHIM_SOURCE)
+        subprocess.run(
+            ["gcc", "-shared", "-fPIC", "-o", str(build_dir / shim.name), str(src), "-ldl"],
+            check=True,
+            capture_output=True,
+        )
+        os.replace(build_dir / shim.name, shim)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return shim
+
+
+def warm_up() -> list[str]:
+    messages = []
+    try:
+        messages.append(f"Socket shim: {_ensure_shim()}")
+    except (OSError, subprocess.CalledProcessError) as e:
+        messages.append(f"Error: failed to build socket shim: {e}")
+    try:
+        with libreoffice_profile() as profile:
+            messages.append(f"LibreOffice profile: {profile}")
+    except (OSError, RuntimeError) as e:
+        messages.append(f"Error: failed to initialize LibreOffice profile: {e}")
+    return messages
 
 
 
@@ -177,7 +612,44 @@ int close(int fd) {
 
 
 
+def _batch_convert_main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="soffice.py --batch-convert",
+        description="Convert many documents with a bounded number of soffice processes",
+    )
+    parser.add_argument("format", help="Target format, e.g. pdf or pdf:writer_pdf_Export")
+    parser.add_argument("files", nargs="+", help="Documents to convert")
+    parser.add_argument("--outdir", default=".", help="Output directory (default: .)")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=DEFAULT_BATCH_PROCESSES,
+        help=f"Concurrent soffice processes (default: {DEFAULT_BATCH_PROCESSES})",
+    )
+    parser.add_argument("--timeout", type=float, help="Per-file timeout in seconds")
+    args = parser.parse_args(argv)
+
+    results, failures = convert_batch(
+        args.files, args.format, args.outdir, args.processes, args.timeout
+    )
+    for input_file, output in results.items():
+        print(f"{input_file} -> {output}")
+    for input_file, reason in failures.items():
+        print(f"Error: {input_file}: {reason}")
+    print(f"Converted {len(results)} of {len(results) + len(failures)} files")
+    return 1 if failures else 0
+
+
 if __name__ == "__main__":
     import sys
+
+    if sys.argv[1:2] == ["--batch-convert"]:
+        sys.exit(_batch_convert_main(sys.argv[2:]))
+    if sys.argv[1:] == ["--warm-up"]:
+        messages = warm_up()
+        print("\n".join(messages))
+        sys.exit(1 if any(m.startswith("Error") for m in messages) else 0)
     result = run_soffice(sys.argv[1:])
     sys.exit(result.returncode)
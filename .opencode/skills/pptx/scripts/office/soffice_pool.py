@@ -0,0 +1,456 @@
+"""
+Pool of pre-started headless LibreOffice instances.
+
+Every soffice cold start costs several seconds. The pool keeps N instances
+running, each in its own profile slot (see soffice.libreoffice_profile), and
+serves jobs from a shared queue over a local TCP socket (127.0.0.1,
+token-protected). Each instance is
+health-checked before a job and recycled after --max-jobs jobs; an instance
+that exceeds a job's timeout is killed and restarted.
+
+Jobs (one JSON object per line, answered with one JSON object per line):
+    {"op": "convert", "input": "deck.pptx", "format": "pdf", "outdir": "out/"}
+    {"op": "recalc", "input": "model.xlsx"}
+    {"op": "accept_changes", "input": "doc.docx"}
+    {"op": "macro", "input": "doc.docx", "script": "vnd.sun.star.script:..."}
+
+While a pool is running, office.soffice.pool_request() and the scripts built
+on it (thumbnail.py, accept_changes.py, recalc.py) use it automatically and
+fall back to a fresh soffice process otherwise.
+
+Requires the LibreOffice Python-UNO bridge (`import uno`, e.g. the
+python3-uno package), usually only importable by the system Python. The
+server's output goes to a log next to the pool state file.
+
+Usage:
+    python soffice_pool.py start [--workers N] [--max-jobs M]
+    python soffice_pool.py status
+    python soffice_pool.py stop
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+from soffice import POOL_STATE_FILE, get_soffice_env, libreoffice_profile, pool_request
+
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+DEFAULT_MAX_JOBS = 200
+DEFAULT_JOB_TIMEOUT = 120
+STARTUP_TIMEOUT = 60
+POOL_LOG_FILE = POOL_STATE_FILE.with_suffix(".log")
+
+FILTERS = {
+    "pdf": {
+        "text": "writer_pdf_Export",
+        "spreadsheet": "calc_pdf_Export",
+        "presentation": "impress_pdf_Export",
+    },
+    "docx": {"text": "MS Word 2007 XML"},
+    "doc": {"text": "MS Word 97"},
+    "odt": {"text": "writer8"},
+    "xlsx": {"spreadsheet": "Calc MS Excel 2007 XML"},
+    "xls": {"spreadsheet": "MS Excel 97"},
+    "ods": {"spreadsheet": "calc8"},
+    "pptx": {"presentation": "Impress MS PowerPoint 2007 XML"},
+    "ppt": {"presentation": "MS PowerPoint 97"},
+    "odp": {"presentation": "impress8"},
+}
+
+DOCUMENT_SERVICES = [
+    ("com.sun.star.text.TextDocument", "text"),
+    ("com.sun.star.sheet.SpreadsheetDocument", "spreadsheet"),
+    ("com.sun.star.presentation.PresentationDocument", "presentation"),
+]
+
+
+class Instance:
+
+    def __init__(self, index: int):
+        self.index = index
+        self.profile = None
+        self.profile_lease = ExitStack()
+        self.process = None
+        self.desktop = None
+        self.port = None
+        self.jobs = 0
+
+    def start(self) -> None:
+        import uno
+
+        self.profile = self.profile_lease.enter_context(libreoffice_profile())
+        self.port = _free_port()
+        self.process = subprocess.Popen(
+            [
+                "soffice",
+                "--headless",
+                "--invisible",
+                "--nologo",
+                "--nodefault",
+                "--norestore",
+                f"-env:UserInstallation={self.profile.as_uri()}",
+                f"--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=get_soffice_env(),
+        )
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            try:
+                ctx = resolver.resolve(
+                    f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext"
+                )
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.kill()
+                    raise RuntimeError(f"LibreOffice worker {self.index} failed to start")
+                time.sleep(0.25)
+
+        self.desktop = ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.Desktop", ctx
+        )
+        self.context = ctx
+        self.jobs = 0
+
+    def healthy(self) -> bool:
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.desktop = None
+        self.profile_lease.close()
+
+    def stop(self) -> None:
+        try:
+            if self.desktop is not None:
+                self.desktop.terminate()
+            if self.process is not None:
+                self.process.wait(timeout=10)
+        except Exception:
+            pass
+        self.kill()
+
+    def run(self, job: dict) -> dict:
+        op = job.get("op")
+        path = Path(job["input"]).absolute()
+        if not path.exists():
+            return {"ok": False, "error": f"{path} does not exist"}
+
+        doc = self._load(path)
+        try:
+            if op == "convert":
+                return self._convert(doc, path, job)
+            if op == "recalc":
+                doc.calculateAll()
+                doc.store()
+                return {"ok": True}
+            if op == "accept_changes":
+                self._dispatch(doc, ".uno:AcceptAllTrackedChanges")
+                doc.store()
+                return {"ok": True}
+            if op == "macro":
+                self._dispatch(doc, job["script"])
+                return {"ok": True}
+            return {"ok": False, "error": f"Unknown operation: {op}"}
+        finally:
+            try:
+                doc.close(True)
+            except Exception:
+                pass
+
+    def _load(self, path: Path):
+        import uno
+
+        return self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(str(path)), "_blank", 0, _props(Hidden=True)
+        )
+
+    def _convert(self, doc, path: Path, job: dict) -> dict:
+        import uno
+
+        target, _, filter_name = job["format"].partition(":")
+        if not filter_name:
+            kind = next(
+                (k for service, k in DOCUMENT_SERVICES if doc.supportsService(service)),
+                None,
+            )
+            filter_name = FILTERS.get(target, {}).get(kind)
+            if not filter_name:
+                return {"ok": False, "error": f"No export filter for {kind} -> {target}"}
+
+        outdir = Path(job.get("outdir") or path.parent).absolute()
+        outdir.mkdir(parents=True, exist_ok=True)
+        output = outdir / f"{path.stem}.{target}"
+        doc.storeToURL(
+            uno.systemPathToFileUrl(str(output)), _props(FilterName=filter_name)
+        )
+        return {"ok": True, "output": str(output)}
+
+    def _dispatch(self, doc, command: str) -> None:
+        dispatcher = self.context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.frame.DispatchHelper", self.context
+        )
+        frame = doc.getCurrentController().getFrame()
+        dispatcher.executeDispatch(frame, command, "", 0, ())
+
+
+class Job:
+
+    def __init__(self, request: dict):
+        self.request = request
+        self.result = None
+        self.instance = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+
+class Pool:
+
+    def __init__(self, workers: int, max_jobs: int):
+        self.max_jobs = max_jobs
+        self.jobs: queue.Queue = queue.Queue()
+        self.instances = [Instance(i) for i in range(workers)]
+        self.completed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self) -> None:
+        for instance in self.instances:
+            instance.start()
+            thread = threading.Thread(target=self._work, args=(instance,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self) -> None:
+        for _ in self.instances:
+            self.jobs.put(None)
+        for instance in self.instances:
+            instance.stop()
+
+    def submit(self, request: dict) -> dict:
+        job = Job(request)
+        self.jobs.put(job)
+        timeout = request.get("timeout", DEFAULT_JOB_TIMEOUT)
+        if not job.done.wait(timeout):
+            with job.lock:
+                # A job still in the queue must not run after the caller has
+                # given up on it (and possibly fallen back to a cold soffice).
+                job.cancelled = True
+                instance = job.instance
+            if instance is not None:
+                instance.kill()
+            return {"ok": False, "error": f"Job timed out after {timeout}s"}
+        return job.result
+
+    def status(self) -> dict:
+        return {
+            "ok": True,
+            "workers": [
+                {"index": i.index, "healthy": i.healthy(), "jobs": i.jobs}
+                for i in self.instances
+            ],
+            "queued": self.jobs.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def _work(self, instance: Instance) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+
+            with job.lock:
+                if job.cancelled:
+                    continue
+                job.instance = instance
+            try:
+                if not instance.healthy():
+                    instance.kill()
+                    instance.start()
+                job.result = instance.run(job.request)
+            except Exception as e:
+                job.result = {"ok": False, "error": str(e)}
+            finally:
+                job.instance = None
+
+            instance.jobs += 1
+            with self.lock:
+                if job.result.get("ok"):
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            job.done.set()
+
+            if instance.jobs >= self.max_jobs or not instance.healthy():
+                instance.stop()
+                try:
+                    instance.start()
+                except Exception:
+                    # Leave it unhealthy; the next job restarts it.
+                    instance.kill()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return self._reply({"ok": False, "error": "Malformed request"})
+
+        if request.pop("token", None) != self.server.token:
+            return self._reply({"ok": False, "error": "Invalid pool token"})
+
+        op = request.get("op")
+        if op == "status":
+            return self._reply(self.server.pool.status())
+        if op == "shutdown":
+            self._reply({"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        self._reply(self.server.pool.submit(request))
+
+    def _reply(self, response: dict) -> None:
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(workers: int, max_jobs: int, port: int = 0) -> None:
+    pool = Pool(workers, max_jobs)
+    pool.start()
+
+    server = _Server(("127.0.0.1", port), _Handler)
+    server.pool = pool
+    server.token = secrets.token_hex(16)
+
+    state = {
+        "host": "127.0.0.1",
+        "port": server.server_address[1],
+        "pid": os.getpid(),
+        "token": server.token,
+        "workers": workers,
+    }
+    fd = os.open(POOL_STATE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(state, f)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.stop()
+        POOL_STATE_FILE.unlink(missing_ok=True)
+
+
+def start(workers: int, max_jobs: int) -> str:
+    if pool_request({"op": "status"}) is not None:
+        return "Pool already running"
+    if importlib.util.find_spec("uno") is None:
+        return (
+            f"Error: {sys.executable} cannot import uno; install python3-uno or run "
+            "soffice_pool.py with the Python that LibreOffice's UNO bridge is built for"
+        )
+
+    with open(POOL_LOG_FILE, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).absolute()), "serve",
+             "--workers", str(workers), "--max-jobs", str(max_jobs)],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + STARTUP_TIMEOUT * workers
+    while time.monotonic() < deadline:
+        if pool_request({"op": "status"}) is not None:
+            return f"Started LibreOffice pool with {workers} worker(s)"
+        if process.poll() is not None:
+            return f"Error: LibreOffice pool exited during startup:\n{_log_tail()}"
+        time.sleep(0.5)
+    return f"Error: LibreOffice pool did not start (see {POOL_LOG_FILE})"
+
+
+def _log_tail(lines: int = 20) -> str:
+    try:
+        text = POOL_LOG_FILE.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return f"(no log at {POOL_LOG_FILE})"
+    return "\n".join(text.strip().splitlines()[-lines:]) or f"(empty log at {POOL_LOG_FILE})"
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _props(**kwargs) -> tuple:
+    import uno
+
+    props = []
+    for name, value in kwargs.items():
+        prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        prop.Name = name
+        prop.Value = value
+        props.append(prop)
+    return tuple(props)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pool of headless LibreOffice workers")
+    parser.add_argument("command", choices=["start", "serve", "status", "stop"])
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=DEFAULT_MAX_JOBS,
+        help=f"Recycle a worker after this many jobs (default: {DEFAULT_MAX_JOBS})",
+    )
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.workers, args.max_jobs)
+    elif args.command == "start":
+        message = start(args.workers, args.max_jobs)
+        print(message)
+        if "Error" in message:
+            sys.exit(1)
+    else:
+        response = pool_request({"op": "shutdown" if args.command == "stop" else "status"})
+        if response is None:
+            print("No LibreOffice pool running")
+            sys.exit(1)
+        print(json.dumps(response, indent=2))
@@ -0,0 +1,258 @@
+"""Read-only view of a .pptx package: relationships, slides and dependencies.
+
+Accepts a .pptx file or an unpacked directory (write_subset needs a file).
+
+Parses each .rels part at most once and exposes the relationship graph, so
+callers can compute the parts a slide depends on (layout, master, theme,
+media), hash a slide together with everything that affects how it renders,
+or write a smaller package that contains only some of the slides.
+
+Usage:
+    from package import Package
+
+    with Package("deck.pptx") as pkg:
+        for slide in pkg.slides():
+            print(slide["name"], pkg.slide_digest(slide["part"]))
+        pkg.write_subset(["ppt/slides/slide3.xml"], "subset.pptx")
+"""
+
+import hashlib
+import posixpath
+import zipfile
+from pathlib import Path
+
+import lxml.etree
+
+PACKAGE_RELS = "_rels/.rels"
+PRESENTATION = "ppt/presentation.xml"
+CONTENT_TYPES = "[Content_Types].xml"
+
+P_NS = "http://schemas.openxmlformats.org/presentationml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+RELS_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+
+# Relationships that do not change how a slide looks: notes, comments,
+# hyperlinks to other slides, and a master's list of all its layouts.
+NON_RENDER_TYPES = {"notesSlide", "slide", "comments", "commentAuthors", "tags"}
+MASTER_ONLY_TYPES = {"slideLayout"}
+
+_PARSER = lxml.etree.XMLParser(
+    huge_tree=True, resolve_entities=False, no_network=True, strip_cdata=False
+)
+
+
+def parse_xml(data: bytes):
+    return lxml.etree.fromstring(data, _PARSER)
+
+
+def rels_part(part: str) -> str:
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{name}.rels")
+
+
+def resolve_target(part: str, target: str) -> str:
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def rel_kind(rel_type: str) -> str:
+    return rel_type.rsplit("/", 1)[-1]
+
+
+def parse_rels(data: bytes, part: str) -> list[dict]:
+    rels = []
+    for rel in parse_xml(data).iter(f"{{{RELS_NS}}}Relationship"):
+        external = rel.get("TargetMode") == "External"
+        target = rel.get("Target", "")
+        rels.append(
+            {
+                "id": rel.get("Id"),
+                "type": rel_kind(rel.get("Type", "")),
+                "target": target if external else resolve_target(part, target),
+                "external": external,
+            }
+        )
+    return rels
+
+
+class Package:
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.is_dir():
+            self.zf = None
+            self.names = {
+                p.relative_to(self.path).as_posix() for p in self.path.rglob("*") if p.is_file()
+            }
+        else:
+            self.zf = zipfile.ZipFile(self.path)
+            self.names = set(self.zf.namelist())
+        self._rels: dict[str, list[dict]] = {}
+        self._digests: dict[str, bytes] = {}
+        self._presentation = None
+
+    def __enter__(self) -> "Package":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.zf is not None:
+            self.zf.close()
+
+    def read(self, part: str) -> bytes:
+        if self.zf is None:
+            return (self.path / part).read_bytes()
+        return self.zf.read(part)
+
+    def xml(self, part: str):
+        return parse_xml(self.read(part))
+
+    def rels(self, part: str) -> list[dict]:
+        cached = self._rels.get(part)
+        if cached is not None:
+            return cached
+
+        source = rels_part(part)
+        rels = parse_rels(self.read(source), part) if source in self.names else []
+        self._rels[part] = rels
+        return rels
+
+    def presentation(self):
+        if self._presentation is None:
+            self._presentation = self.xml(PRESENTATION)
+        return self._presentation
+
+    def slides(self) -> list[dict]:
+        targets = {rel["id"]: rel["target"] for rel in self.rels(PRESENTATION)}
+        slides = []
+        for sld_id in self.presentation().iter(f"{{{P_NS}}}sldId"):
+            part = targets.get(sld_id.get(f"{{{R_NS}}}id"))
+            if part is None or part not in self.names:
+                continue
+            slides.append(
+                {
+                    "name": posixpath.basename(part),
+                    "part": part,
+                    "id": sld_id.get("id"),
+                    "hidden": sld_id.get("show") == "0",
+                }
+            )
+        return slides
+
+    def closure(self, part: str, render_only: bool = True) -> list[str]:
+        seen = {part}
+        stack = [part]
+        while stack:
+            current = stack.pop()
+            is_master = "/slideMasters/" in current
+            for rel in self.rels(current):
+                if rel["external"] or rel["target"] in seen or rel["target"] not in self.names:
+                    continue
+                if render_only and (
+                    rel["type"] in NON_RENDER_TYPES
+                    or (is_master and rel["type"] in MASTER_ONLY_TYPES)
+                ):
+                    continue
+                seen.add(rel["target"])
+                stack.append(rel["target"])
+        return sorted(seen)
+
+    def part_digest(self, part: str) -> bytes:
+        digest = self._digests.get(part)
+        if digest is None:
+            h = hashlib.sha256(self.read(part))
+            rels = rels_part(part)
+            if rels in self.names:
+                h.update(self.read(rels))
+            digest = h.digest()
+            self._digests[part] = digest
+        return digest
+
+    def slide_digest(self, part: str) -> str:
+        h = hashlib.sha256()
+        for name in ("sldSz", "defaultTextStyle"):
+            element = self.presentation().find(f"{{{P_NS}}}{name}")
+            if element is not None:
+                h.update(lxml.etree.tostring(element, method="c14n"))
+        for dependency in self.closure(part):
+            h.update(dependency.encode("utf-8") + b"\0")
+            h.update(self.part_digest(dependency))
+        return h.hexdigest()
+
+    def reachable(self, exclude: set[str] = frozenset()) -> set[str]:
+        seen = set()
+        stack = [""]
+        while stack:
+            current = stack.pop()
+            for rel in self.rels(current):
+                target = rel["target"]
+                if rel["external"] or target in seen or target in exclude:
+                    continue
+                if target not in self.names:
+                    continue
+                seen.add(target)
+                stack.append(target)
+        return seen
+
+    def write_subset(self, slide_parts: list[str], output) -> None:
+        keep = set(slide_parts)
+        dropped = {slide["part"] for slide in self.slides()} - keep
+        # Notes of dropped slides point back at them; leave them out too.
+        for part in dropped.copy():
+            dropped.update(
+                rel["target"] for rel in self.rels(part) if rel["type"] == "notesSlide"
+            )
+        parts = self.reachable(exclude=dropped)
+        parts.add(CONTENT_TYPES)
+        parts.update(rels_part(part) for part in list(parts) if rels_part(part) in self.names)
+        parts.add(PACKAGE_RELS)
+
+        presentation_rels = rels_part(PRESENTATION)
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zout:
+            for info in self.zf.infolist():
+                if info.filename not in parts:
+                    continue
+                data = self.zf.read(info)
+                if info.filename == PRESENTATION:
+                    data = self._subset_presentation(keep)
+                elif info.filename == presentation_rels:
+                    data = drop_relationships(data, PRESENTATION, dropped)
+                elif info.filename == CONTENT_TYPES:
+                    data = drop_overrides(data, set(self.names) - parts)
+                zout.writestr(info, data)
+
+    def _subset_presentation(self, keep: set[str]) -> bytes:
+        root = parse_xml(self.read(PRESENTATION))
+        targets = {rel["id"]: rel["target"] for rel in self.rels(PRESENTATION)}
+        for sld_id in list(root.iter(f"{{{P_NS}}}sldId")):
+            if targets.get(sld_id.get(f"{{{R_NS}}}id")) not in keep:
+                sld_id.getparent().remove(sld_id)
+        return serialize(root)
+
+
+def drop_relationships(data: bytes, part: str, targets: set[str]) -> bytes:
+    root = parse_xml(data)
+    for rel in list(root):
+        if rel.get("TargetMode") == "External":
+            continue
+        if resolve_target(part, rel.get("Target", "")) in targets:
+            root.remove(rel)
+    return serialize(root)
+
+
+def drop_overrides(data: bytes, parts: set[str]) -> bytes:
+    root = parse_xml(data)
+    for override in list(root.iter(f"{{{CT_NS}}}Override")):
+        if override.get("PartName", "").lstrip("/") in parts:
+            root.remove(override)
+    return serialize(root)
+
+
+def serialize(root) -> bytes:
+    return b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + lxml.etree.tostring(
+        root, encoding="UTF-8"
+    )
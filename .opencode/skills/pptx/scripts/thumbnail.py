@@ -4,8 +4,17 @@ Creates a grid layout of slide thumbnails for quick visual analysis.
 Labels each thumbnail with its XML filename (e.g., slide1.xml).
 Hidden slides are shown with a placeholder pattern.
 
+Rendered slides are cached by a hash of the slide XML and everything it
+depends on (layout, master, theme, media), so after an edit only new or
+changed slides go through LibreOffice again: they are rendered from a
+temporary copy of the deck that contains just those slides. Slides that
+show a slide number are also keyed on their position and rendered from the
+full deck, since a smaller copy would renumber them. Set SOFFICE_CACHE=off
+to render everything from scratch.
+
 Usage:
-    python thumbnail.py input.pptx [output_prefix] [--cols N]
+    python thumbnail.py input.pptx [output_prefix] [--cols N] [--slides SEL]
+                        [--format jpg|png|webp] [--single] [--index]
 
 Examples:
     python thumbnail.py presentation.pptx
@@ -13,28 +22,50 @@ Examples:
 
     python thumbnail.py template.pptx grid --cols 4
     # Creates: grid.jpg (or grid-1.jpg, grid-2.jpg for large decks)
+
+    python thumbnail.py deck.pptx sheet --format webp --single --index
+    # Creates: sheet.webp (all slides) and sheet.json (position of each slide)
+
+    python thumbnail.py deck.pptx picks --slides 3,17,42
+    # Renders only slides 3, 17 and 42 (numbered in presentation order)
+
+From Python, slide_images(path, outdir, slides=[3, 17, 42]) renders just the
+selected slides and returns get_slide_info() entries with an "image" path.
 """
 
 import argparse
+import json
+import os
 import subprocess
 import sys
 import tempfile
-import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import defusedxml.minidom
-from office.soffice import get_soffice_env
+from office.cache import DEFAULT_CACHE_DIR, cache_key, clone_file, data_dir, lookup, store
+from office.soffice import convert_document, soffice_installation
+from package import P_NS, Package, parse_xml
 from PIL import Image, ImageDraw, ImageFont
 
 THUMBNAIL_WIDTH = 300
-CONVERSION_DPI = 100
 MAX_COLS = 6
 DEFAULT_COLS = 3
 JPEG_QUALITY = 95
+WEBP_QUALITY = 90
+WEBP_MAX_SIZE = 16383
+FORMATS = ("jpg", "png", "webp")
 GRID_PADDING = 20
 BORDER_WIDTH = 2
 FONT_SIZE_RATIO = 0.10
 LABEL_PADDING_RATIO = 0.4
+RENDER_CACHE_VERSION = 3
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+SLIDE_NUMBER_FIELDS = {
+    # Any field on the slide itself; on layouts and masters only fields
+    # outside placeholders, since those placeholders are not drawn.
+    "slide": ".//a:fld[@type='slidenum']",
+    "inherited": ".//p:sp[not(p:nvSpPr/p:nvPr/p:ph)]//a:fld[@type='slidenum']",
+}
 
 
 def main():
@@ -54,6 +85,26 @@ def main():
         default=DEFAULT_COLS,
         help=f"Number of columns (default: {DEFAULT_COLS}, max: {MAX_COLS})",
     )
+    parser.add_argument(
+        "--slides",
+        help="Only these slides: positions, ranges or file names (e.g. 3,17,40-42,slide9.xml)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="jpg",
+        help="Image format of the grids (default: jpg)",
+    )
+    parser.add_argument(
+        "--single",
+        action="store_true",
+        help="Put all slides in one tall image instead of several grids",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Also write <output_prefix>.json with each slide's grid image and position",
+    )
 
     args = parser.parse_args()
 
@@ -66,22 +117,26 @@ def main():
         print(f"Error: Invalid PowerPoint file: {args.input}", file=sys.stderr)
         sys.exit(1)
 
-    output_path = Path(f"{args.output_prefix}.jpg")
+    output_path = Path(f"{args.output_prefix}.{args.format}")
+    index_path = Path(f"{args.output_prefix}.json") if args.index else None
 
     try:
-        slide_info = get_slide_info(input_path)
+        slide_info = select_slides(get_slide_info(input_path), args.slides)
 
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
-            visible_images = convert_to_images(input_path, temp_path)
+            visible = [s["name"] for s in slide_info if not s["hidden"]]
+            visible_images = render_slides(input_path, visible, temp_path)
 
             if not visible_images and not any(s["hidden"] for s in slide_info):
                 print("Error: No slides found", file=sys.stderr)
                 sys.exit(1)
 
-            slides = build_slide_list(slide_info, visible_images, temp_path)
+            slides = build_slide_list(slide_info, visible_images)
 
-            grid_files = create_grids(slides, cols, THUMBNAIL_WIDTH, output_path)
+            grid_files = create_grids(
+                slides, cols, THUMBNAIL_WIDTH, output_path, args.single, index_path
+            )
 
             print(f"Created {len(grid_files)} grid(s):")
             for grid_file in grid_files:
@@ -93,56 +148,170 @@ def main():
 
 
 def get_slide_info(pptx_path: Path) -> list[dict]:
-    with zipfile.ZipFile(pptx_path, "r") as zf:
-        rels_content = zf.read("ppt/_rels/presentation.xml.rels").decode("utf-8")
-        rels_dom = defusedxml.minidom.parseString(rels_content)
-
-        rid_to_slide = {}
-        for rel in rels_dom.getElementsByTagName("Relationship"):
-            rid = rel.getAttribute("Id")
-            target = rel.getAttribute("Target")
-            rel_type = rel.getAttribute("Type")
-            if "slide" in rel_type and target.startswith("slides/"):
-                rid_to_slide[rid] = target.replace("slides/", "")
-
-        pres_content = zf.read("ppt/presentation.xml").decode("utf-8")
-        pres_dom = defusedxml.minidom.parseString(pres_content)
-
-        slides = []
-        for sld_id in pres_dom.getElementsByTagName("p:sldId"):
-            rid = sld_id.getAttribute("r:id")
-            if rid in rid_to_slide:
-                hidden = sld_id.getAttribute("show") == "0"
-                slides.append({"name": rid_to_slide[rid], "hidden": hidden})
-
-        return slides
+    with Package(pptx_path) as pkg:
+        return [{"name": slide["name"], "hidden": slide["hidden"]} for slide in pkg.slides()]
+
+
+def slide_images(
+    pptx_path: Path,
+    outdir: Path,
+    slides: str | list | None = None,
+    width: int = THUMBNAIL_WIDTH,
+) -> list[dict]:
+    slide_info = select_slides(get_slide_info(pptx_path), slides)
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        visible = [s["name"] for s in slide_info if not s["hidden"]]
+        images = render_slides(pptx_path, visible, Path(temp_dir), width=width)
+        result = []
+        for info in slide_info:
+            image = None
+            if info["name"] in images:
+                image = outdir / f"{Path(info['name']).stem}.jpg"
+                clone_file(images[info["name"]], image)
+            result.append({**info, "image": image})
+    return result
+
+
+def select_slides(slide_info: list[dict], selection: str | list | None) -> list[dict]:
+    if selection is None:
+        return slide_info
+    if isinstance(selection, str):
+        selection = [item.strip() for item in selection.split(",") if item.strip()]
+
+    by_name = {info["name"]: i for i, info in enumerate(slide_info)}
+    wanted = set()
+    for item in selection:
+        item = str(item)
+        if item in by_name or f"{item}.xml" in by_name:
+            wanted.add(by_name.get(item, by_name.get(f"{item}.xml")))
+            continue
+        first, _, last = item.partition("-")
+        if not first.isdigit() or (last and not last.isdigit()):
+            raise ValueError(f"Invalid slide selection: {item}")
+        for number in range(int(first), int(last or first) + 1):
+            if not 1 <= number <= len(slide_info):
+                raise ValueError(f"Slide {number} out of range (1-{len(slide_info)})")
+            wanted.add(number - 1)
+    return [slide_info[i] for i in sorted(wanted)]
+
+
+def render_slides(
+    pptx_path: Path,
+    names: list[str],
+    temp_dir: Path,
+    cache_dir: Path | None = DEFAULT_CACHE_DIR,
+    width: int = THUMBNAIL_WIDTH,
+) -> dict[str, Path]:
+    if os.environ.get("SOFFICE_CACHE", "").lower() in ("0", "off", "false"):
+        cache_dir = None
+
+    with Package(pptx_path) as pkg:
+        deck = pkg.slides()
+        parts = {slide["name"]: slide["part"] for slide in deck}
+        position = {slide["name"]: i for i, slide in enumerate(deck)}
+        # Pages come back in deck order, whatever order names were given in.
+        names = sorted(names, key=position.__getitem__)
+        first_number = int(pkg.presentation().get("firstSlideNum", "1"))
+        fields = {}
+
+        def key_for(name: str) -> str:
+            # The digest ignores where the slide sits in the deck, so slides
+            # that draw their own number also key on it.
+            number = None
+            if shows_slide_number(pkg, parts[name], fields):
+                number = first_number + position[name]
+            return cache_key(
+                "slide-image",
+                RENDER_CACHE_VERSION,
+                width,
+                soffice_installation(),
+                pkg.slide_digest(parts[name]),
+                number,
+            )
+
+        keys = {name: key_for(name) for name in names}
+
+        images = {}
+        missing = {}
+        for name in names:
+            entry = lookup(cache_dir, keys[name]) if cache_dir else None
+            if entry is not None and (data_dir(entry) / "slide.jpg").exists():
+                images[name] = data_dir(entry) / "slide.jpg"
+            else:
+                missing.setdefault(keys[name], name)
+        if not missing:
+            return images
+
+        visible = [slide["name"] for slide in deck if not slide["hidden"]]
+        # A subset deck renumbers its slides, so numbered slides come from
+        # the full deck (which also refreshes every other visible slide).
+        if len(missing) == len(names) == len(visible) or any(
+            shows_slide_number(pkg, parts[name], fields) for name in missing.values()
+        ):
+            source = pptx_path
+            render = [(keys.get(name) or key_for(name), name) for name in visible]
+        else:
+            source = temp_dir / "changed-slides.pptx"
+            pkg.write_subset([parts[name] for name in missing.values()], source)
+            render = list(missing.items())
+
+    render_dir = Path(tempfile.mkdtemp(prefix="render-", dir=temp_dir))
+    pages = convert_to_images(source, render_dir, width)
+    if len(pages) != len(render):
+        raise RuntimeError(f"Rendered {len(pages)} pages for {len(render)} slides")
+
+    rendered = {}
+    for (key, _), page in zip(render, pages):
+        if key in rendered:
+            continue
+        rendered[key] = page
+        if cache_dir:
+            try:
+                entry = store(cache_dir, key, lambda data: clone_file(page, data / "slide.jpg"))
+                rendered[key] = data_dir(entry) / "slide.jpg"
+            except OSError:
+                pass
+    for name in names:
+        if name not in images:
+            images[name] = rendered[keys[name]]
+    return images
+
+
+def shows_slide_number(pkg: Package, part: str, fields: dict) -> bool:
+    namespaces = {"a": A_NS, "p": P_NS}
+    for dependency in pkg.closure(part):
+        found = fields.get(dependency)
+        if found is None:
+            found = False
+            if dependency == part:
+                path = SLIDE_NUMBER_FIELDS["slide"]
+            elif "/slideLayouts/" in dependency or "/slideMasters/" in dependency:
+                path = SLIDE_NUMBER_FIELDS["inherited"]
+            else:
+                path = None
+            if path is not None:
+                data = pkg.read(dependency)
+                if b"slidenum" in data:
+                    found = bool(parse_xml(data).xpath(path, namespaces=namespaces))
+            fields[dependency] = found
+        if found:
+            return True
+    return False
 
 
 def build_slide_list(
     slide_info: list[dict],
-    visible_images: list[Path],
-    temp_dir: Path,
-) -> list[tuple[Path, str]]:
-    if visible_images:
-        with Image.open(visible_images[0]) as img:
-            placeholder_size = img.size
-    else:
-        placeholder_size = (1920, 1080)
-
+    images: dict[str, Path],
+) -> list[tuple[Path | None, str]]:
     slides = []
-    visible_idx = 0
-
     for info in slide_info:
         if info["hidden"]:
-            placeholder_path = temp_dir / f"hidden-{info['name']}.jpg"
-            placeholder_img = create_hidden_placeholder(placeholder_size)
-            placeholder_img.save(placeholder_path, "JPEG")
-            slides.append((placeholder_path, f"{info['name']} (hidden)"))
-        else:
-            if visible_idx < len(visible_images):
-                slides.append((visible_images[visible_idx], info["name"]))
-                visible_idx += 1
-
+            slides.append((None, f"{info['name']} (hidden)"))
+        elif info["name"] in images:
+            slides.append((images[info["name"]], info["name"]))
     return slides
 
 
@@ -155,59 +324,81 @@ def create_hidden_placeholder(size: tuple[int, int]) -> Image.Image:
     return img
 
 
-def convert_to_images(pptx_path: Path, temp_dir: Path) -> list[Path]:
-    pdf_path = temp_dir / f"{pptx_path.stem}.pdf"
+def convert_to_images(
+    pptx_path: Path,
+    temp_dir: Path,
+    width: int = THUMBNAIL_WIDTH,
+    workers: int | None = None,
+) -> list[Path]:
+    pdf_path = convert_document(str(pptx_path), "pdf", str(temp_dir))
+    if pdf_path is None:
+        raise RuntimeError("PDF conversion failed")
 
-    result = subprocess.run(
-        [
-            "soffice",
-            "--headless",
-            "--convert-to",
-            "pdf",
-            "--outdir",
-            str(temp_dir),
-            str(pptx_path),
-        ],
-        capture_output=True,
-        text=True,
-        env=get_soffice_env(),
+    pages = pdf_page_count(pdf_path)
+    if pages is None:
+        ranges = [None]
+    else:
+        workers = max(1, min(workers or os.cpu_count() or 1, pages))
+        bounds = [pages * i // workers for i in range(workers + 1)]
+        ranges = [(bounds[i] + 1, bounds[i + 1]) for i in range(workers)]
+
+    prefix = temp_dir / "slide"
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        results = list(
+            pool.map(lambda page_range: rasterize(pdf_path, prefix, width, page_range), ranges)
+        )
+    if not all(results):
+        raise RuntimeError("Image conversion failed")
+
+    return sorted(
+        temp_dir.glob("slide-*.jpg"), key=lambda path: int(path.stem.rpartition("-")[2])
     )
-    if result.returncode != 0 or not pdf_path.exists():
-        raise RuntimeError("PDF conversion failed")
 
+
+def pdf_page_count(pdf_path: Path) -> int | None:
+    try:
+        result = subprocess.run(
+            ["pdfinfo", str(pdf_path)], capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    for line in result.stdout.splitlines():
+        key, _, value = line.partition(":")
+        if key == "Pages" and value.strip().isdigit():
+            return int(value)
+    return None
+
+
+def rasterize(
+    pdf_path: Path, prefix: Path, width: int, pages: tuple[int, int] | None
+) -> bool:
+    cmd = ["pdftoppm", "-jpeg", "-scale-to-x", str(width), "-scale-to-y", "-1"]
+    if pages is not None:
+        cmd += ["-f", str(pages[0]), "-l", str(pages[1])]
     result = subprocess.run(
-        [
-            "pdftoppm",
-            "-jpeg",
-            "-r",
-            str(CONVERSION_DPI),
-            str(pdf_path),
-            str(temp_dir / "slide"),
-        ],
-        capture_output=True,
-        text=True,
+        cmd + [str(pdf_path), str(prefix)], capture_output=True, text=True
     )
-    if result.returncode != 0:
-        raise RuntimeError("Image conversion failed")
-
-    return sorted(temp_dir.glob("slide-*.jpg"))
+    return result.returncode == 0
 
 
 def create_grids(
-    slides: list[tuple[Path, str]],
+    slides: list[tuple[Path | None, str]],
     cols: int,
     width: int,
     output_path: Path,
+    single: bool = False,
+    index_path: Path | None = None,
 ) -> list[str]:
-    max_per_grid = cols * (cols + 1)
+    max_per_grid = len(slides) if single else cols * (cols + 1)
+    height = int(width * slide_aspect(slides))
+    placeholder = create_hidden_placeholder((width, height))
     grid_files = []
+    entries = []
 
     for chunk_idx, start_idx in enumerate(range(0, len(slides), max_per_grid)):
         end_idx = min(start_idx + max_per_grid, len(slides))
         chunk_slides = slides[start_idx:end_idx]
 
-        grid = create_grid(chunk_slides, cols, width)
-
         if len(slides) <= max_per_grid:
             grid_filename = output_path
         else:
@@ -215,25 +406,54 @@ def create_grids(
             suffix = output_path.suffix
             grid_filename = output_path.parent / f"{stem}-{chunk_idx + 1}{suffix}"
 
+        grid, boxes = create_grid(chunk_slides, cols, width, height, placeholder)
         grid_filename.parent.mkdir(parents=True, exist_ok=True)
-        grid.save(str(grid_filename), quality=JPEG_QUALITY)
+        save_grid(grid, grid_filename)
+        grid.close()
         grid_files.append(str(grid_filename))
 
+        for (_, label), box in zip(chunk_slides, boxes):
+            entries.append({"label": label, "image": str(grid_filename), "box": box})
+
+    if index_path is not None:
+        index_path.write_text(
+            json.dumps({"width": width, "height": height, "slides": entries}, indent=2)
+        )
     return grid_files
 
 
+def slide_aspect(slides: list[tuple[Path | None, str]]) -> float:
+    first = next((path for path, _ in slides if path is not None), None)
+    if first is None:
+        return 9 / 16
+    with Image.open(first) as img:
+        return img.height / img.width
+
+
+def save_grid(grid: Image.Image, path: Path) -> None:
+    suffix = path.suffix.lower()
+    if suffix == ".webp":
+        if max(grid.size) > WEBP_MAX_SIZE:
+            raise ValueError(
+                f"Grid is {grid.width}x{grid.height}px, larger than WebP allows; use PNG"
+            )
+        grid.save(str(path), "WEBP", quality=WEBP_QUALITY)
+    elif suffix == ".png":
+        grid.save(str(path), "PNG")
+    else:
+        grid.save(str(path), "JPEG", quality=JPEG_QUALITY)
+
+
 def create_grid(
-    slides: list[tuple[Path, str]],
+    slides: list[tuple[Path | None, str]],
     cols: int,
     width: int,
-) -> Image.Image:
+    height: int,
+    placeholder: Image.Image,
+) -> tuple[Image.Image, list[list[int]]]:
     font_size = int(width * FONT_SIZE_RATIO)
     label_padding = int(font_size * LABEL_PADDING_RATIO)
 
-    with Image.open(slides[0][0]) as img:
-        aspect = img.height / img.width
-    height = int(width * aspect)
-
     rows = (len(slides) + cols - 1) // cols
     grid_w = cols * width + (cols + 1) * GRID_PADDING
     grid_h = rows * (height + font_size + label_padding * 2) + (rows + 1) * GRID_PADDING
@@ -246,6 +466,7 @@ def create_grid(
     except Exception:
         font = ImageFont.load_default()
 
+    boxes = []
     for i, (img_path, slide_name) in enumerate(slides):
         row, col = i // cols, i % cols
         x = col * width + (col + 1) * GRID_PADDING
@@ -265,24 +486,33 @@ def create_grid(
 
         y_thumbnail = y_base + label_padding + font_size + label_padding
 
-        with Image.open(img_path) as img:
-            img.thumbnail((width, height), Image.Resampling.LANCZOS)
-            w, h = img.size
+        if img_path is None:
+            w, h = placeholder.size
             tx = x + (width - w) // 2
             ty = y_thumbnail + (height - h) // 2
-            grid.paste(img, (tx, ty))
-
-            if BORDER_WIDTH > 0:
-                draw.rectangle(
-                    [
-                        (tx - BORDER_WIDTH, ty - BORDER_WIDTH),
-                        (tx + w + BORDER_WIDTH - 1, ty + h + BORDER_WIDTH - 1),
-                    ],
-                    outline="gray",
-                    width=BORDER_WIDTH,
-                )
-
-    return grid
+            grid.paste(placeholder, (tx, ty))
+        else:
+            with Image.open(img_path) as img:
+                # Let the JPEG decoder downscale by a power of two first.
+                img.draft("RGB", (width, height))
+                img.thumbnail((width, height), Image.Resampling.LANCZOS)
+                w, h = img.size
+                tx = x + (width - w) // 2
+                ty = y_thumbnail + (height - h) // 2
+                grid.paste(img, (tx, ty))
+        boxes.append([tx, ty, w, h])
+
+        if BORDER_WIDTH > 0:
+            draw.rectangle(
+                [
+                    (tx - BORDER_WIDTH, ty - BORDER_WIDTH),
+                    (tx + w + BORDER_WIDTH - 1, ty + h + BORDER_WIDTH - 1),
+                ],
+                outline="gray",
+                width=BORDER_WIDTH,
+            )
+
+    return grid, boxes
 
 
 if __name__ == "__main__":
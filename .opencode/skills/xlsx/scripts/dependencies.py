@@ -0,0 +1,286 @@
+"""
+Formula dependency index and error root-cause analysis for xlsx workbooks.
+
+build_index() reads every formula in the sheet XML (shared formulas included)
+and records the cell ranges each one references. Unlike formulas.py it does
+not need to understand the functions involved, so it works for any workbook.
+The index is cached under the office cache directory, keyed by the package
+digest, so repeated checks of the same workbook skip the parse.
+
+root_causes() takes the error cells found after a recalculation, links each
+one to the error cells it references and keeps only those with no erroneous
+precedent. Every root cause comes with its blast radius: the number of error
+cells downstream of it.
+
+Usage:
+    from dependencies import load_index, root_causes
+
+    index = load_index("model.xlsx")
+    causes = root_causes(index, {("Sheet1", 4, 2): "#REF!", ...})
+
+    python dependencies.py model.xlsx
+"""
+
+import bisect
+import json
+import sys
+import zipfile
+from collections import defaultdict, deque
+from pathlib import Path
+
+import lxml.etree
+
+from formulas import (
+    Unsupported,
+    column_letters,
+    parse_reference,
+    relative_template,
+    shift_formula,
+    split_address,
+    tokenize,
+    workbook_parts,
+)
+from office.cache import (
+    DEFAULT_CACHE_DIR,
+    cache_key,
+    data_dir,
+    lookup,
+    package_digest,
+    store,
+)
+
+INDEX_VERSION = 1
+INDEX_FILE = "index.json"
+
+
+def load_index(path, cache_dir=DEFAULT_CACHE_DIR) -> dict:
+    key = cache_key("formula-index", INDEX_VERSION, package_digest(Path(path)))
+    entry = lookup(cache_dir, key)
+    if entry is not None:
+        try:
+            return _decode(json.loads((data_dir(entry) / INDEX_FILE).read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            pass
+
+    index = build_index(path)
+
+    def populate(data: Path) -> dict:
+        (data / INDEX_FILE).write_text(json.dumps(_encode(index)), encoding="utf-8")
+        return {"formulas": len(index["precedents"])}
+
+    try:
+        store(cache_dir, key, populate)
+    except OSError:
+        pass
+    return index
+
+
+def build_index(path) -> dict:
+    precedents = {}
+    texts = {}
+    bounds = {}
+    with zipfile.ZipFile(path) as zf:
+        parts, defined, local_defined = workbook_parts(zf)
+        names = _name_references(defined)
+        for sheet, part in parts.items():
+            sheet_names = names
+            if sheet in local_defined:
+                sheet_names = {**names, **_name_references(local_defined[sheet])}
+            bounds[sheet] = _index_sheet(zf, sheet, part, sheet_names, precedents, texts)
+
+    for key, refs in precedents.items():
+        precedents[key] = [_resolve(ref, key[0], bounds) for ref in refs]
+        precedents[key] = [ref for ref in precedents[key] if ref is not None]
+    return {"bounds": bounds, "precedents": precedents, "formulas": texts}
+
+
+def _name_references(defined: dict[str, str]) -> dict[str, list]:
+    names = {}
+    for name, text in defined.items():
+        try:
+            names[name] = _references(text, {})
+        except Unsupported:
+            continue
+    return names
+
+
+def _index_sheet(zf, sheet: str, part: str, names: dict, precedents: dict, texts: dict) -> list[int]:
+    max_row = max_col = 0
+    shared = {}
+    templates = {}
+    with zf.open(part) as f:
+        for _, row in lxml.etree.iterparse(
+            f, events=("end",), tag="{*}row", huge_tree=True, resolve_entities=False
+        ):
+            for cell in row:
+                if cell.get("r") is None:
+                    continue
+                try:
+                    r, c = split_address(cell.get("r"))
+                except Unsupported:
+                    continue
+                max_row = max(max_row, r)
+                max_col = max(max_col, c)
+
+                formula = next((child for child in cell if child.tag.endswith("}f")), None)
+                if formula is None:
+                    continue
+                key = (sheet, r, c)
+                text = formula.text or ""
+                if text.strip():
+                    texts[key] = text
+                precedents[key] = _formula_references(key, formula, text, names, shared, templates)
+            row.clear()
+            while row.getprevious() is not None:
+                del row.getparent()[0]
+    return [max_row, max_col]
+
+
+def _formula_references(key: tuple, f, text: str, names: dict, shared: dict, templates: dict) -> list:
+    _, row, col = key
+    if f.get("t") == "shared" and not text.strip():
+        master = shared.get(f.get("si"))
+        if master is None:
+            return []
+        (_, master_row, master_col), refs = master
+        return [shift_formula(ref, row - master_row, col - master_col) for ref in refs]
+
+    template = relative_template(text, row, col)
+    cached = templates.get(template) if template is not None else None
+    if cached is not None:
+        (_, origin_row, origin_col), refs = cached
+        refs = [shift_formula(ref, row - origin_row, col - origin_col) for ref in refs]
+    else:
+        try:
+            refs = _references(text, names)
+        except Unsupported:
+            refs = []
+        if template is not None:
+            templates[template] = (key, refs)
+
+    if f.get("t") == "shared":
+        shared[f.get("si")] = (key, refs)
+    return refs
+
+
+def _references(text: str, names: dict) -> list:
+    refs = []
+    for kind, value in tokenize(text):
+        if kind == "ref":
+            refs.append(parse_reference(value))
+        elif kind == "name":
+            refs.extend(names.get(value.upper(), ()))
+    return refs
+
+
+def _resolve(ref: tuple, sheet: str, bounds: dict):
+    _, ref_sheet, r1, c1, r2, c2, _ = ref
+    sheet = ref_sheet or sheet
+    if sheet not in bounds:
+        return None
+    max_row, max_col = bounds[sheet]
+    return (
+        sheet,
+        r1,
+        c1,
+        max(r1, max_row) if r2 is None else r2,
+        max(c1, max_col) if c2 is None else c2,
+    )
+
+
+def _encode(index: dict) -> dict:
+    return {
+        "bounds": index["bounds"],
+        "precedents": [[*key, refs] for key, refs in index["precedents"].items()],
+        "formulas": [[*key, text] for key, text in index["formulas"].items()],
+    }
+
+
+def _decode(data: dict) -> dict:
+    return {
+        "bounds": data["bounds"],
+        "precedents": {
+            (sheet, r, c): [tuple(ref) for ref in refs]
+            for sheet, r, c, refs in data["precedents"]
+        },
+        "formulas": {(sheet, r, c): text for sheet, r, c, text in data["formulas"]},
+    }
+
+
+def root_causes(index: dict, errors: dict[tuple, str]) -> list[dict]:
+    by_column = defaultdict(list)
+    for sheet, r, c in errors:
+        by_column[(sheet, c)].append(r)
+    for rows in by_column.values():
+        rows.sort()
+
+    dependents = defaultdict(list)
+    has_precedent = set()
+    for key in errors:
+        found = set()
+        for sheet, r1, c1, r2, c2 in index["precedents"].get(key, ()):
+            for c in range(c1, c2 + 1):
+                rows = by_column.get((sheet, c))
+                if not rows:
+                    continue
+                lo = bisect.bisect_left(rows, r1)
+                hi = bisect.bisect_right(rows, r2)
+                found.update((sheet, r, c) for r in rows[lo:hi])
+        found.discard(key)
+        for precedent in found:
+            dependents[precedent].append(key)
+        if found:
+            has_precedent.add(key)
+
+    roots = {key for key in errors if key not in has_precedent}
+    reached = set()
+    causes = []
+    for key in sorted(roots):
+        affected = _downstream(key, dependents)
+        reached.update(affected)
+        causes.append((key, len(affected)))
+
+    # Error cells that only reference each other form cycles with no root;
+    # report one cell per cycle so nothing goes missing.
+    for key in sorted(errors):
+        if key in reached or key in roots:
+            continue
+        affected = _downstream(key, dependents)
+        reached.update(affected)
+        reached.add(key)
+        causes.append((key, len(affected - {key})))
+
+    causes.sort(key=lambda cause: (-cause[1], cause[0]))
+    report = []
+    for key, affected in causes:
+        sheet, r, c = key
+        item = {
+            "cell": f"{sheet}!{column_letters(c)}{r}",
+            "error": errors[key],
+            "affected_cells": affected,
+        }
+        if key in index["formulas"]:
+            item["formula"] = index["formulas"][key]
+        report.append(item)
+    return report
+
+
+def _downstream(key: tuple, dependents: dict) -> set:
+    seen = set()
+    queue = deque(dependents.get(key, ()))
+    while queue:
+        current = queue.popleft()
+        if current in seen:
+            continue
+        seen.add(current)
+        queue.extend(dependents.get(current, ()))
+    return seen
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python dependencies.py <excel_file>", file=sys.stderr)
+        sys.exit(1)
+    index = load_index(sys.argv[1])
+    refs = sum(len(refs) for refs in index["precedents"].values())
+    print(f"Indexed {len(index['precedents'])} formulas with {refs} references in {sys.argv[1]}")
@@ -0,0 +1,179 @@
+"""
+Content-addressed local cache shared by the office scripts.
+
+Each entry is a directory <cache_dir>/<key>/ holding a data/ tree and a
+meta.json file. Keys are SHA-256 digests of the inputs (file contents plus
+options); package_digest() hashes the uncompressed parts of an OOXML package
+and skips docProps/, so re-zipping or metadata-only edits keep the same key.
+Reading an entry refreshes its meta.json mtime; when the cache grows beyond
+its size cap, the least recently used entries are evicted.
+
+Entries are materialized with copy-on-write clones (FICLONE) where the
+filesystem supports them and plain copies otherwise. Hard links are not
+used: unpacked files are edited in place, which would corrupt the cache.
+
+Usage:
+    from office.cache import cache_key, file_digest, lookup, store
+
+    key = cache_key("pdf", file_digest(path))
+    entry = lookup(cache_dir, key)
+    if entry is None:
+        entry = store(cache_dir, key, build_into_data_dir, max_bytes=...)
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Callable
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get("OFFICE_CACHE_DIR")
+    or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "office-skills"
+)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+_FICLONE = 0x40049409
+_META = "meta.json"
+_DATA = "data"
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def package_digest(path: Path, exclude_prefixes: tuple[str, ...] = ("docProps/",)) -> str:
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        return file_digest(path)
+
+    digest = hashlib.sha256()
+    with zf:
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            if info.is_dir() or info.filename.startswith(exclude_prefixes):
+                continue
+            digest.update(info.filename.encode("utf-8") + b"\0")
+            member = hashlib.sha256()
+            with zf.open(info) as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    member.update(chunk)
+            digest.update(member.digest())
+    return digest.hexdigest()
+
+
+def cache_key(*parts) -> str:
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def lookup(cache_dir: Path, key: str) -> Path | None:
+    entry = Path(cache_dir) / key
+    meta = entry / _META
+    if not meta.exists():
+        return None
+    try:
+        os.utime(meta)
+    except OSError:
+        return None
+    return entry
+
+
+def read_meta(entry: Path) -> dict:
+    return json.loads((entry / _META).read_text(encoding="utf-8"))
+
+
+def data_dir(entry: Path) -> Path:
+    return entry / _DATA
+
+
+def store(
+    cache_dir: Path,
+    key: str,
+    populate: Callable[[Path], dict | None],
+    max_bytes: int = DEFAULT_MAX_BYTES,
+) -> Path:
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=cache_dir))
+    try:
+        (staging / _DATA).mkdir()
+        meta = populate(staging / _DATA) or {}
+        meta["size"] = _tree_size(staging / _DATA)
+        (staging / _META).write_text(json.dumps(meta), encoding="utf-8")
+
+        entry = cache_dir / key
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            if not (entry / _META).exists():
+                raise
+            shutil.rmtree(staging, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    evict(cache_dir, max_bytes, keep={key})
+    return entry
+
+
+def evict(cache_dir: Path, max_bytes: int, keep: set[str] | None = None) -> list[str]:
+    keep = keep or set()
+    entries = []
+    total = 0
+    for meta in Path(cache_dir).glob(f"*/{_META}"):
+        try:
+            size = json.loads(meta.read_text(encoding="utf-8")).get("size", 0)
+            entries.append((meta.stat().st_mtime, meta.parent, size))
+        except (OSError, ValueError):
+            continue
+        total += size
+
+    evicted = []
+    for _, entry, size in sorted(entries, key=lambda e: e[0]):
+        if total <= max_bytes:
+            break
+        if entry.name in keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        evicted.append(entry.name)
+    return evicted
+
+
+def materialize(source: Path, destination: Path) -> None:
+    destination.mkdir(parents=True, exist_ok=True)
+    # os.walk skips unreadable directories by default; an entry evicted
+    # mid-copy must fail instead of yielding a partial tree.
+    for root, dirs, files in os.walk(source, onerror=_raise):
+        rel = Path(root).relative_to(source)
+        for name in dirs:
+            (destination / rel / name).mkdir(exist_ok=True)
+        for name in files:
+            clone_file(Path(root) / name, destination / rel / name)
+
+
+def _raise(error: OSError) -> None:
+    raise error
+
+
+def clone_file(source: Path, destination: Path) -> None:
+    try:
+        with open(source, "rb") as src, open(destination, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def _tree_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
@@ -6,115 +6,179 @@ Works on runs in paragraphs and inside tracked changes (<w:ins>, <w:del>).
 Also:
 - Removes rsid attributes from runs (revision metadata that doesn't affect rendering)
 - Removes proofErr elements (spell/grammar markers that block merging)
+
+Each run's formatting is reduced once to an integer fingerprint (an interned
+canonical form of its <w:rPr>), so merge decisions are integer comparisons.
+The same fingerprints back a formatting histogram of the document:
+
+    python -m helpers.merge_runs unpacked/
 """
 
+import json
+import sys
+from collections import Counter
 from pathlib import Path
 
-import defusedxml.minidom
+import lxml.etree
+
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
 
 
 def merge_runs(input_dir: str) -> tuple[int, str]:
-    doc_xml = Path(input_dir) / "word" / "document.xml"
+    from .normalize import normalize_document
+
+    merge_count, _, message = normalize_document(input_dir, simplify_redlines=False)
+    if message.startswith("Error"):
+        return 0, message
+    return merge_count, f"Merged {merge_count} runs"
+
+
+def merge_runs_in_tree(runs: list, proof_errs: list) -> int:
+    for elem in proof_errs:
+        _remove_element(elem)
+
+    for run in runs:
+        _strip_run_rsid_attrs(run)
+
+    formats: dict = {}
+    fingerprints = {run: run_fingerprint(run, formats) for run in runs}
+    containers = dict.fromkeys(run.getparent() for run in runs)
+
+    merge_count = 0
+    for container in containers:
+        merge_count += _merge_runs_in(container, fingerprints)
+    return merge_count
+
+
+def run_fingerprint(run, formats: dict) -> int:
+    rpr = _get_child(run, "rPr")
+    key = None if rpr is None else _canonical_form(rpr)
+    return formats.setdefault(key, len(formats))
 
-    if not doc_xml.exists():
-        return 0, f"Error: {doc_xml} not found"
 
-    try:
-        dom = defusedxml.minidom.parseString(doc_xml.read_text(encoding="utf-8"))
-        root = dom.documentElement
+def formatting_histogram(input_dir: str) -> list[dict]:
+    from .normalize import parse_document
 
-        _remove_elements(root, "proofErr")
-        _strip_run_rsid_attrs(root)
+    root = parse_document(Path(input_dir) / "word" / "document.xml").getroot()
+    formats: dict = {}
+    examples = {}
+    counts: Counter = Counter()
+    for run in root.iter(lxml.etree.Element):
+        if _local_name(run) != "r":
+            continue
+        fingerprint = run_fingerprint(run, formats)
+        counts[fingerprint] += 1
+        examples.setdefault(fingerprint, _get_child(run, "rPr"))
 
-        containers = {run.parentNode for run in _find_elements(root, "r")}
+    return [
+        {
+            "fingerprint": fingerprint,
+            "runs": count,
+            "properties": _describe_rpr(examples[fingerprint]),
+        }
+        for fingerprint, count in counts.most_common()
+    ]
 
-        merge_count = 0
-        for container in containers:
-            merge_count += _merge_runs_in(container)
 
-        doc_xml.write_bytes(dom.toxml(encoding="UTF-8"))
-        return merge_count, f"Merged {merge_count} runs"
+def _canonical_form(elem) -> tuple:
+    return (
+        elem.tag,
+        tuple(sorted(elem.attrib.items())),
+        (elem.text or "").strip(),
+        tuple(sorted(_canonical_form(child) for child in elem if _is_element(child))),
+    )
 
-    except Exception as e:
-        return 0, f"Error: {e}"
 
+def _describe_rpr(rpr) -> list[str]:
+    if rpr is None:
+        return []
+    properties = []
+    for child in rpr:
+        if not _is_element(child):
+            continue
+        attrs = {key.rpartition("}")[2]: value for key, value in child.attrib.items()}
+        if list(attrs) == ["val"]:
+            properties.append(f"{_local_name(child)}={attrs['val']}")
+        elif attrs:
+            details = ",".join(f"{key}={value}" for key, value in sorted(attrs.items()))
+            properties.append(f"{_local_name(child)}({details})")
+        else:
+            properties.append(_local_name(child))
+    return properties
 
 
 
-def _find_elements(root, tag: str) -> list:
-    results = []
 
-    def traverse(node):
-        if node.nodeType == node.ELEMENT_NODE:
-            name = node.localName or node.tagName
-            if name == tag or name.endswith(f":{tag}"):
-                results.append(node)
-            for child in node.childNodes:
-                traverse(child)
+def _local_name(elem) -> str:
+    return elem.tag.rpartition("}")[2]
 
-    traverse(root)
-    return results
+
+def _is_element(node) -> bool:
+    return isinstance(node.tag, str)
 
 
 def _get_child(parent, tag: str):
-    for child in parent.childNodes:
-        if child.nodeType == child.ELEMENT_NODE:
-            name = child.localName or child.tagName
-            if name == tag or name.endswith(f":{tag}"):
-                return child
+    for child in parent:
+        if _is_element(child) and _local_name(child) == tag:
+            return child
     return None
 
 
 def _get_children(parent, tag: str) -> list:
-    results = []
-    for child in parent.childNodes:
-        if child.nodeType == child.ELEMENT_NODE:
-            name = child.localName or child.tagName
-            if name == tag or name.endswith(f":{tag}"):
-                results.append(child)
-    return results
+    return [
+        child for child in parent if _is_element(child) and _local_name(child) == tag
+    ]
 
 
 def _is_adjacent(elem1, elem2) -> bool:
-    node = elem1.nextSibling
-    while node:
-        if node == elem2:
-            return True
-        if node.nodeType == node.ELEMENT_NODE:
+    node = elem1
+    while node is not None:
+        if node.tail and node.tail.strip():
             return False
-        if node.nodeType == node.TEXT_NODE and node.data.strip():
+        node = node.getnext()
+        if node is elem2:
+            return True
+        if node is not None and _is_element(node):
             return False
-        node = node.nextSibling
     return False
 
 
+def _remove_element(elem) -> None:
+    parent = elem.getparent()
+    if parent is None:
+        return
+    if elem.tail:
+        prev = elem.getprevious()
+        if prev is not None:
+            prev.tail = (prev.tail or "") + elem.tail
+        else:
+            parent.text = (parent.text or "") + elem.tail
+    parent.remove(elem)
 
 
-def _remove_elements(root, tag: str):
-    for elem in _find_elements(root, tag):
-        if elem.parentNode:
-            elem.parentNode.removeChild(elem)
 
 
-def _strip_run_rsid_attrs(root):
-    for run in _find_elements(root, "r"):
-        for attr in list(run.attributes.values()):
-            if "rsid" in attr.name.lower():
-                run.removeAttribute(attr.name)
+def _strip_run_rsid_attrs(run):
+    for name in [name for name in run.attrib if "rsid" in name.rpartition("}")[2].lower()]:
+        del run.attrib[name]
 
 
 
 
-def _merge_runs_in(container) -> int:
+def _merge_runs_in(container, fingerprints: dict) -> int:
     merge_count = 0
     run = _first_child_run(container)
 
-    while run:
+    while run is not None:
         while True:
             next_elem = _next_element_sibling(run)
-            if next_elem and _is_run(next_elem) and _can_merge(run, next_elem):
+            if (
+                next_elem is not None
+                and _is_run(next_elem)
+                and fingerprints[next_elem] == fingerprints[run]
+            ):
                 _merge_run_content(run, next_elem)
-                container.removeChild(next_elem)
+                _remove_element(next_elem)
                 merge_count += 1
             else:
                 break
@@ -126,53 +190,39 @@ def _merge_runs_in(container) -> int:
 
 
 def _first_child_run(container):
-    for child in container.childNodes:
-        if child.nodeType == child.ELEMENT_NODE and _is_run(child):
+    for child in container:
+        if _is_element(child) and _is_run(child):
             return child
     return None
 
 
 def _next_element_sibling(node):
-    sibling = node.nextSibling
-    while sibling:
-        if sibling.nodeType == sibling.ELEMENT_NODE:
+    sibling = node.getnext()
+    while sibling is not None:
+        if _is_element(sibling):
             return sibling
-        sibling = sibling.nextSibling
+        sibling = sibling.getnext()
     return None
 
 
 def _next_sibling_run(node):
-    sibling = node.nextSibling
-    while sibling:
-        if sibling.nodeType == sibling.ELEMENT_NODE:
-            if _is_run(sibling):
-                return sibling
-        sibling = sibling.nextSibling
+    sibling = node.getnext()
+    while sibling is not None:
+        if _is_element(sibling) and _is_run(sibling):
+            return sibling
+        sibling = sibling.getnext()
     return None
 
 
 def _is_run(node) -> bool:
-    name = node.localName or node.tagName
-    return name == "r" or name.endswith(":r")
-
-
-def _can_merge(run1, run2) -> bool:
-    rpr1 = _get_child(run1, "rPr")
-    rpr2 = _get_child(run2, "rPr")
-
-    if (rpr1 is None) != (rpr2 is None):
-        return False
-    if rpr1 is None:
-        return True
-    return rpr1.toxml() == rpr2.toxml()  
+    return _local_name(node) == "r"
 
 
 def _merge_run_content(target, source):
-    for child in list(source.childNodes):
-        if child.nodeType == child.ELEMENT_NODE:
-            name = child.localName or child.tagName
-            if name != "rPr" and not name.endswith(":rPr"):
-                target.appendChild(child)
+    for child in list(source):
+        if _is_element(child) and _local_name(child) != "rPr":
+            child.tail = None
+            target.append(child)
 
 
 def _consolidate_text(run):
@@ -182,18 +232,19 @@ def _consolidate_text(run):
         curr, prev = t_elements[i], t_elements[i - 1]
 
         if _is_adjacent(prev, curr):
-            prev_text = prev.firstChild.data if prev.firstChild else ""
-            curr_text = curr.firstChild.data if curr.firstChild else ""
-            merged = prev_text + curr_text
-
-            if prev.firstChild:
-                prev.firstChild.data = merged
-            else:
-                prev.appendChild(run.ownerDocument.createTextNode(merged))
+            merged = (prev.text or "") + (curr.text or "")
+            prev.text = merged
 
             if merged.startswith(" ") or merged.endswith(" "):
-                prev.setAttribute("xml:space", "preserve")
-            elif prev.hasAttribute("xml:space"):
-                prev.removeAttribute("xml:space")
+                prev.set(XML_SPACE, "preserve")
+            elif XML_SPACE in prev.attrib:
+                del prev.attrib[XML_SPACE]
+
+            _remove_element(curr)
+
 
-            run.removeChild(curr)
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m helpers.merge_runs <unpacked_dir>", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(formatting_histogram(sys.argv[1]), indent=2))
@@ -2,6 +2,9 @@
 
 Validates with auto-repair, condenses XML formatting, and creates the Office file.
 
+Directories produced by `unpack.py --parts` are completed from the original
+archive: parts that were never extracted are copied over unchanged.
+
 Usage:
     python pack.py <input_directory> <output_file> [--original <file>] [--validate true|false]
 
@@ -11,6 +14,7 @@ Examples:
 """
 
 import argparse
+import json
 import sys
 import shutil
 import tempfile
@@ -19,6 +23,7 @@ from pathlib import Path
 
 import defusedxml.minidom
 
+from unpack import PARTS_MANIFEST
 from validators import DOCXSchemaValidator, PPTXSchemaValidator, RedliningValidator
 
 def pack(
@@ -38,7 +43,16 @@ def pack(
     if suffix not in {".docx", ".pptx", ".xlsx"}:
         return None, f"Error: {output_file} must be a .docx, .pptx, or .xlsx file"
 
-    if validate and original_file:
+    manifest = _read_parts_manifest(input_dir)
+    if manifest is not None:
+        source_path = Path(original_file or manifest["source"])
+        if not source_path.exists():
+            return None, (
+                f"Error: {input_dir} is a partial unpack and its source "
+                f"{source_path} was not found (pass --original)"
+            )
+
+    if validate and original_file and manifest is None:
         original_path = Path(original_file)
         if original_path.exists():
             success, output = _run_validation(
@@ -51,11 +65,32 @@ def pack(
 
     with tempfile.TemporaryDirectory() as temp_dir:
         temp_content_dir = Path(temp_dir) / "content"
-        shutil.copytree(input_dir, temp_content_dir)
+        shutil.copytree(
+            input_dir, temp_content_dir, ignore=shutil.ignore_patterns(PARTS_MANIFEST)
+        )
+
+        edited_files = [
+            xml_file
+            for pattern in ["*.xml", "*.rels"]
+            for xml_file in temp_content_dir.rglob(pattern)
+        ]
+
+        if manifest is not None:
+            _restore_unextracted_parts(
+                source_path, temp_content_dir, set(manifest["members"])
+            )
+
+            if validate and original_file and Path(original_file).exists():
+                success, output = _run_validation(
+                    temp_content_dir, Path(original_file), suffix, infer_author_func
+                )
+                if output:
+                    print(output)
+                if not success:
+                    return None, f"Error: Validation failed for {input_dir}"
 
-        for pattern in ["*.xml", "*.rels"]:
-            for xml_file in temp_content_dir.rglob(pattern):
-                _condense_xml(xml_file)
+        for xml_file in edited_files:
+            _condense_xml(xml_file)
 
         output_path.parent.mkdir(parents=True, exist_ok=True)
         with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
@@ -66,6 +101,25 @@ def pack(
     return None, f"Successfully packed {input_dir} to {output_file}"
 
 
+def _read_parts_manifest(input_dir: Path) -> dict | None:
+    manifest_path = input_dir / PARTS_MANIFEST
+    if not manifest_path.exists():
+        return None
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+def _restore_unextracted_parts(
+    source_path: Path, content_dir: Path, extracted: set[str]
+) -> None:
+    with zipfile.ZipFile(source_path, "r") as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.filename in extracted:
+                continue
+            if (content_dir / info.filename).exists():
+                continue
+            zf.extract(info, content_dir)
+
+
 def _run_validation(
     unpacked_dir: Path,
     original_file: Path,
@@ -136,7 +190,8 @@ if __name__ == "__main__":
     parser.add_argument("output_file", help="Output Office file (.docx/.pptx/.xlsx)")
     parser.add_argument(
         "--original",
-        help="Original file for validation comparison",
+        help="Original file for validation comparison (and the source of "
+        "unextracted parts for directories unpacked with --parts)",
     )
     parser.add_argument(
         "--validate",
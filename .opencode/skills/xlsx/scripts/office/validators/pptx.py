@@ -22,6 +22,20 @@ class PPTXSchemaValidator(BaseSchemaValidator):
         "tablestyleid": "tablestyles",
     }
 
+    UUID_PATTERN = re.compile(
+        r"^[\{\(]?[0-9A-Fa-f]{8}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{12}[\}\)]?$"
+    )
+
+    # Any *id attribute whose value could pass _looks_like_uuid; files without
+    # one are not parsed at all.
+    UUID_CANDIDATE_PATTERN = re.compile(
+        rb"""id\s*=\s*["'][-{}()&#;0-9A-Za-z\x80-\xff]{32,}["']""", re.IGNORECASE
+    )
+
+    def __init__(self, unpacked_dir, original_file=None, verbose=False):
+        super().__init__(unpacked_dir, original_file, verbose)
+        self._structure = None
+
     def validate(self):
         if not self.validate_xml():
             return False
@@ -63,24 +77,25 @@ class PPTXSchemaValidator(BaseSchemaValidator):
         import lxml.etree
 
         errors = []
-        uuid_pattern = re.compile(
-            r"^[\{\(]?[0-9A-Fa-f]{8}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{12}[\}\)]?$"
-        )
 
         for xml_file in self.xml_files:
             try:
+                if not self.UUID_CANDIDATE_PATTERN.search(xml_file.read_bytes()):
+                    continue
+
                 root = lxml.etree.parse(str(xml_file)).getroot()
 
                 for elem in root.iter():
                     for attr, value in elem.attrib.items():
+                        if len(value) < 32:
+                            continue
                         attr_name = attr.split("}")[-1].lower()
-                        if attr_name == "id" or attr_name.endswith("id"):
-                            if self._looks_like_uuid(value):
-                                if not uuid_pattern.match(value):
-                                    errors.append(
-                                        f"  {xml_file.relative_to(self.unpacked_dir)}: "
-                                        f"Line {elem.sourceline}: ID '{value}' appears to be a UUID but contains invalid hex characters"
-                                    )
+                        if attr_name.endswith("id") and self._looks_like_uuid(value):
+                            if not self.UUID_PATTERN.match(value):
+                                errors.append(
+                                    f"  {xml_file.relative_to(self.unpacked_dir)}: "
+                                    f"Line {elem.sourceline}: ID '{value}' appears to be a UUID but contains invalid hex characters"
+                                )
 
             except (lxml.etree.XMLSyntaxError, Exception) as e:
                 errors.append(
@@ -101,60 +116,97 @@ class PPTXSchemaValidator(BaseSchemaValidator):
         clean_value = value.strip("{}()").replace("-", "")
         return len(clean_value) == 32 and all(c.isalnum() for c in clean_value)
 
-    def validate_slide_layout_ids(self):
+    def _slide_structure(self):
+        if self._structure is None:
+            self._structure = self._scan_structure()
+        return self._structure
+
+    def _scan_structure(self):
         import lxml.etree
 
-        errors = []
+        slides_rels_dir = self.unpacked_dir / "ppt" / "slides" / "_rels"
+        masters_dir = self.unpacked_dir / "ppt" / "slideMasters"
+        slide_rels_files = sorted(
+            f
+            for f in self.xml_files
+            if f.parent == slides_rels_dir and f.name.endswith(".xml.rels")
+        )
+        master_files = sorted(
+            f for f in self.xml_files if f.parent == masters_dir and f.suffix == ".xml"
+        )
 
-        slide_masters = list(self.unpacked_dir.glob("ppt/slideMasters/*.xml"))
+        def read_rels(rels_file):
+            root = lxml.etree.parse(str(rels_file)).getroot()
+            return [
+                (rel.get("Id"), rel.get("Type", ""), rel.get("Target", ""))
+                for rel in root.iter(
+                    f"{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
+                )
+            ]
 
-        if not slide_masters:
-            if self.verbose:
-                print("PASSED - No slide masters found")
-            return True
+        slides = []
+        for rels_file in slide_rels_files:
+            try:
+                slides.append({"rels_file": rels_file, "rels": read_rels(rels_file)})
+            except Exception as e:
+                slides.append({"rels_file": rels_file, "rels": [], "error": e})
 
-        for slide_master in slide_masters:
+        masters = []
+        for slide_master in master_files:
+            rels_file = slide_master.parent / "_rels" / f"{slide_master.name}.rels"
+            master = {"file": slide_master, "rels_file": rels_file, "rels": None}
             try:
                 root = lxml.etree.parse(str(slide_master)).getroot()
+                master["layout_ids"] = [
+                    (
+                        el.get(f"{{{self.OFFICE_RELATIONSHIPS_NAMESPACE}}}id"),
+                        el.get("id"),
+                        el.sourceline,
+                    )
+                    for el in root.iter(f"{{{self.PRESENTATIONML_NAMESPACE}}}sldLayoutId")
+                ]
+                if rels_file.exists():
+                    master["rels"] = read_rels(rels_file)
+            except Exception as e:
+                master["error"] = e
+            masters.append(master)
 
-                rels_file = slide_master.parent / "_rels" / f"{slide_master.name}.rels"
+        return {"slides": slides, "masters": masters}
 
-                if not rels_file.exists():
-                    errors.append(
-                        f"  {slide_master.relative_to(self.unpacked_dir)}: "
-                        f"Missing relationships file: {rels_file.relative_to(self.unpacked_dir)}"
-                    )
-                    continue
+    def validate_slide_layout_ids(self):
+        errors = []
 
-                rels_root = lxml.etree.parse(str(rels_file)).getroot()
-
-                valid_layout_rids = set()
-                for rel in rels_root.findall(
-                    f".//{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
-                ):
-                    rel_type = rel.get("Type", "")
-                    if "slideLayout" in rel_type:
-                        valid_layout_rids.add(rel.get("Id"))
-
-                for sld_layout_id in root.findall(
-                    f".//{{{self.PRESENTATIONML_NAMESPACE}}}sldLayoutId"
-                ):
-                    r_id = sld_layout_id.get(
-                        f"{{{self.OFFICE_RELATIONSHIPS_NAMESPACE}}}id"
-                    )
-                    layout_id = sld_layout_id.get("id")
+        slide_masters = self._slide_structure()["masters"]
 
-                    if r_id and r_id not in valid_layout_rids:
-                        errors.append(
-                            f"  {slide_master.relative_to(self.unpacked_dir)}: "
-                            f"Line {sld_layout_id.sourceline}: sldLayoutId with id='{layout_id}' "
-                            f"references r:id='{r_id}' which is not found in slide layout relationships"
-                        )
+        if not slide_masters:
+            if self.verbose:
+                print("PASSED - No slide masters found")
+            return True
 
-            except (lxml.etree.XMLSyntaxError, Exception) as e:
+        for master in slide_masters:
+            master_path = master["file"].relative_to(self.unpacked_dir)
+            if "error" in master:
+                errors.append(f"  {master_path}: Error: {master['error']}")
+                continue
+
+            if master["rels"] is None:
                 errors.append(
-                    f"  {slide_master.relative_to(self.unpacked_dir)}: Error: {e}"
+                    f"  {master_path}: "
+                    f"Missing relationships file: {master['rels_file'].relative_to(self.unpacked_dir)}"
                 )
+                continue
+
+            valid_layout_rids = {
+                rid for rid, rel_type, _ in master["rels"] if "slideLayout" in rel_type
+            }
+
+            for r_id, layout_id, line in master["layout_ids"]:
+                if r_id and r_id not in valid_layout_rids:
+                    errors.append(
+                        f"  {master_path}: "
+                        f"Line {line}: sldLayoutId with id='{layout_id}' "
+                        f"references r:id='{r_id}' which is not found in slide layout relationships"
+                    )
 
         if errors:
             print(f"FAILED - Found {len(errors)} slide layout ID validation errors:")
@@ -170,31 +222,21 @@ class PPTXSchemaValidator(BaseSchemaValidator):
             return True
 
     def validate_no_duplicate_slide_layouts(self):
-        import lxml.etree
-
         errors = []
-        slide_rels_files = list(self.unpacked_dir.glob("ppt/slides/_rels/*.xml.rels"))
-
-        for rels_file in slide_rels_files:
-            try:
-                root = lxml.etree.parse(str(rels_file)).getroot()
 
-                layout_rels = [
-                    rel
-                    for rel in root.findall(
-                        f".//{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
-                    )
-                    if "slideLayout" in rel.get("Type", "")
-                ]
+        for slide in self._slide_structure()["slides"]:
+            rels_path = slide["rels_file"].relative_to(self.unpacked_dir)
+            if "error" in slide:
+                errors.append(f"  {rels_path}: Error: {slide['error']}")
+                continue
 
-                if len(layout_rels) > 1:
-                    errors.append(
-                        f"  {rels_file.relative_to(self.unpacked_dir)}: has {len(layout_rels)} slideLayout references"
-                    )
+            layout_rels = [
+                rid for rid, rel_type, _ in slide["rels"] if "slideLayout" in rel_type
+            ]
 
-            except Exception as e:
+            if len(layout_rels) > 1:
                 errors.append(
-                    f"  {rels_file.relative_to(self.unpacked_dir)}: Error: {e}"
+                    f"  {rels_path}: has {len(layout_rels)} slideLayout references"
                 )
 
         if errors:
@@ -208,45 +250,31 @@ class PPTXSchemaValidator(BaseSchemaValidator):
             return True
 
     def validate_notes_slide_references(self):
-        import lxml.etree
-
         errors = []
-        notes_slide_references = {}  
+        notes_slide_references = {}
 
-        slide_rels_files = list(self.unpacked_dir.glob("ppt/slides/_rels/*.xml.rels"))
+        slides = self._slide_structure()["slides"]
 
-        if not slide_rels_files:
+        if not slides:
             if self.verbose:
                 print("PASSED - No slide relationship files found")
             return True
 
-        for rels_file in slide_rels_files:
-            try:
-                root = lxml.etree.parse(str(rels_file)).getroot()
-
-                for rel in root.findall(
-                    f".//{{{self.PACKAGE_RELATIONSHIPS_NAMESPACE}}}Relationship"
-                ):
-                    rel_type = rel.get("Type", "")
-                    if "notesSlide" in rel_type:
-                        target = rel.get("Target", "")
-                        if target:
-                            normalized_target = target.replace("../", "")
-
-                            slide_name = rels_file.stem.replace(
-                                ".xml", ""
-                            )  
-
-                            if normalized_target not in notes_slide_references:
-                                notes_slide_references[normalized_target] = []
-                            notes_slide_references[normalized_target].append(
-                                (slide_name, rels_file)
-                            )
-
-            except (lxml.etree.XMLSyntaxError, Exception) as e:
+        for slide in slides:
+            rels_file = slide["rels_file"]
+            if "error" in slide:
                 errors.append(
-                    f"  {rels_file.relative_to(self.unpacked_dir)}: Error: {e}"
+                    f"  {rels_file.relative_to(self.unpacked_dir)}: Error: {slide['error']}"
                 )
+                continue
+
+            slide_name = rels_file.stem.replace(".xml", "")
+            for _, rel_type, target in slide["rels"]:
+                if "notesSlide" in rel_type and target:
+                    normalized_target = target.replace("../", "")
+                    notes_slide_references.setdefault(normalized_target, []).append(
+                        (slide_name, rels_file)
+                    )
 
         for target, references in notes_slide_references.items():
             if len(references) > 1:
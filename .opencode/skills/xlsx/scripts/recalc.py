@@ -1,22 +1,44 @@
 """
 Excel Formula Recalculation Script
-Recalculates all formulas in an Excel file using LibreOffice
+Recalculates all formulas in an Excel file, then scans the result for error
+cells and formulas in one streaming pass over the sheet XML.
+
+Workbooks are recalculated by LibreOffice. --engine python uses the in-process
+engine in formulas.py instead, and --engine auto tries it first and falls back
+to LibreOffice for anything it cannot handle.
+With --batch, all LibreOffice-bound files are recalculated in one session; a
+file that crashes LibreOffice is reported and the session restarts after it
 """
 
+import argparse
 import json
 import os
 import platform
+import posixpath
+import signal
 import subprocess
-import sys
+import tempfile
+import zipfile
 from pathlib import Path
 
-from office.soffice import get_soffice_env
+import lxml.etree
 
-from openpyxl import load_workbook
+from dependencies import load_index, root_causes
+from formulas import Unsupported, recalculate_file, split_address
+from office.soffice import get_soffice_env, libreoffice_profile, pool_request
 
-MACRO_DIR_MACOS = "~/Library/Application Support/LibreOffice/4/user/basic/Standard"
-MACRO_DIR_LINUX = "~/.config/libreoffice/4/user/basic/Standard"
-MACRO_FILENAME = "Module1.xba"
+EXCEL_ERRORS = [
+    "#VALUE!",
+    "#DIV/0!",
+    "#REF!",
+    "#NAME?",
+    "#NULL!",
+    "#NUM!",
+    "#N/A",
+]
+MAX_LOCATIONS = 20
+
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
 
 RECALCULATE_MACRO = """<?xml version="1.0" encoding="UTF-8"?>
 <!DOCTYPE script:module PUBLIC "-//OpenOffice.org//DTD OfficeDocument 1.0//EN" "module.dtd">
@@ -26,6 +48,52 @@ RECALCULATE_MACRO = """<?xml version="1.0" encoding="UTF-8"?>
       ThisComponent.store()
       ThisComponent.close(True)
     End Sub
+
+    Sub RecalculateBatch()
+      Dim listNum As Integer, path As String, ok As Boolean
+      listNum = FreeFile
+      Open Environ("RECALC_BATCH_LIST") For Input As #listNum
+      Do While Not EOF(listNum)
+        Line Input #listNum, path
+        If path &lt;&gt; "" Then
+          WriteBatchStatus("start", path)
+          ok = RecalculateFile(path)
+          If ok Then
+            WriteBatchStatus("ok", path)
+          Else
+            WriteBatchStatus("error", path)
+          End If
+        End If
+      Loop
+      Close #listNum
+      StarDesktop.terminate()
+    End Sub
+
+    Function RecalculateFile(path As String) As Boolean
+      Dim doc As Object
+      Dim args(0) As New com.sun.star.beans.PropertyValue
+      On Error GoTo Failed
+      args(0).Name = "Hidden"
+      args(0).Value = True
+      doc = StarDesktop.loadComponentFromURL(ConvertToURL(path), "_blank", 0, args())
+      doc.calculateAll()
+      doc.store()
+      doc.close(True)
+      RecalculateFile = True
+      Exit Function
+    Failed:
+      On Error Resume Next
+      If Not IsNull(doc) Then doc.close(True)
+      RecalculateFile = False
+    End Function
+
+    Sub WriteBatchStatus(state As String, path As String)
+      Dim statusNum As Integer
+      statusNum = FreeFile
+      Open Environ("RECALC_BATCH_STATUS") For Append As #statusNum
+      Print #statusNum, state &amp; Chr(9) &amp; path
+      Close #statusNum
+    End Sub
 </script:module>"""
 
 
@@ -39,144 +107,362 @@ def has_gtimeout():
         return False
 
 
-def setup_libreoffice_macro():
-    macro_dir = os.path.expanduser(
-        MACRO_DIR_MACOS if platform.system() == "Darwin" else MACRO_DIR_LINUX
-    )
-    macro_file = os.path.join(macro_dir, MACRO_FILENAME)
-
-    if (
-        os.path.exists(macro_file)
-        and "RecalculateAndSave" in Path(macro_file).read_text()
-    ):
-        return True
-
-    if not os.path.exists(macro_dir):
-        subprocess.run(
-            ["soffice", "--headless", "--terminate_after_init"],
-            capture_output=True,
-            timeout=10,
-            env=get_soffice_env(),
-        )
-        os.makedirs(macro_dir, exist_ok=True)
-
+def _recalc_with_soffice(abs_path, timeout):
     try:
-        Path(macro_file).write_text(RECALCULATE_MACRO)
-        return True
-    except Exception:
-        return False
-
-
-def recalc(filename, timeout=30):
-    if not Path(filename).exists():
-        return {"error": f"File {filename} does not exist"}
-
-    abs_path = str(Path(filename).absolute())
-
-    if not setup_libreoffice_macro():
+        with libreoffice_profile(RECALCULATE_MACRO) as profile:
+            cmd = [
+                "soffice",
+                "--headless",
+                f"-env:UserInstallation={profile.as_uri()}",
+                "--norestore",
+                "vnd.sun.star.script:Standard.Module1.RecalculateAndSave?language=Basic&location=application",
+                abs_path,
+            ]
+
+            if platform.system() == "Linux":
+                cmd = ["timeout", str(timeout)] + cmd
+            elif platform.system() == "Darwin" and has_gtimeout():
+                cmd = ["gtimeout", str(timeout)] + cmd
+
+            result = subprocess.run(cmd, capture_output=True, text=True, env=get_soffice_env())
+    except (OSError, RuntimeError):
         return {"error": "Failed to setup LibreOffice macro"}
 
-    cmd = [
-        "soffice",
-        "--headless",
-        "--norestore",
-        "vnd.sun.star.script:Standard.Module1.RecalculateAndSave?language=Basic&location=application",
-        abs_path,
-    ]
-
-    if platform.system() == "Linux":
-        cmd = ["timeout", str(timeout)] + cmd
-    elif platform.system() == "Darwin" and has_gtimeout():
-        cmd = ["gtimeout", str(timeout)] + cmd
-
-    result = subprocess.run(cmd, capture_output=True, text=True, env=get_soffice_env())
-
     if result.returncode != 0 and result.returncode != 124:  
         error_msg = result.stderr or "Unknown error during recalculation"
         if "Module1" in error_msg or "RecalculateAndSave" not in error_msg:
             return {"error": "LibreOffice macro not configured properly"}
         return {"error": error_msg}
+    return None
 
-    try:
-        wb = load_workbook(filename, data_only=True)
-
-        excel_errors = [
-            "#VALUE!",
-            "#DIV/0!",
-            "#REF!",
-            "#NAME?",
-            "#NULL!",
-            "#NUM!",
-            "#N/A",
-        ]
-        error_details = {err: [] for err in excel_errors}
-        total_errors = 0
-
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value is not None and isinstance(cell.value, str):
-                        for err in excel_errors:
-                            if err in cell.value:
-                                location = f"{sheet_name}!{cell.coordinate}"
-                                error_details[err].append(location)
-                                total_errors += 1
-                                break
-
-        wb.close()
-
-        result = {
-            "status": "success" if total_errors == 0 else "errors_found",
-            "total_errors": total_errors,
-            "error_summary": {},
-        }
-
-        for err_type, locations in error_details.items():
-            if locations:
-                result["error_summary"][err_type] = {
-                    "count": len(locations),
-                    "locations": locations[:20],  
-                }
-
-        wb_formulas = load_workbook(filename, data_only=False)
-        formula_count = 0
-        for sheet_name in wb_formulas.sheetnames:
-            ws = wb_formulas[sheet_name]
-            for row in ws.iter_rows():
-                for cell in row:
-                    if (
-                        cell.value
-                        and isinstance(cell.value, str)
-                        and cell.value.startswith("=")
-                    ):
-                        formula_count += 1
-        wb_formulas.close()
-
-        result["total_formulas"] = formula_count
-
-        return result
 
+def _recalc_batch_with_soffice(paths, timeout):
+    errors = {}
+    remaining = list(paths)
+    try:
+        with libreoffice_profile(RECALCULATE_MACRO) as profile, tempfile.TemporaryDirectory() as tmp:
+            list_file = Path(tmp) / "files.txt"
+            status_file = Path(tmp) / "status.txt"
+            env = get_soffice_env()
+            env["RECALC_BATCH_LIST"] = str(list_file)
+            env["RECALC_BATCH_STATUS"] = str(status_file)
+
+            while remaining:
+                list_file.write_text("\n".join(remaining) + "\n")
+                status_file.unlink(missing_ok=True)
+                _run_session(
+                    [
+                        "soffice",
+                        "--headless",
+                        f"-env:UserInstallation={profile.as_uri()}",
+                        "--norestore",
+                        "vnd.sun.star.script:Standard.Module1.RecalculateBatch?language=Basic&location=application",
+                    ],
+                    env,
+                    timeout * len(remaining),
+                )
+
+                states = {}
+                if status_file.exists():
+                    for line in status_file.read_text().splitlines():
+                        state, _, path = line.rstrip("\r").partition("\t")
+                        states[path] = state
+                if not states:
+                    for path in remaining:
+                        errors[path] = "LibreOffice did not run the batch macro"
+                    break
+                if not any(path in states for path in remaining):
+                    # The macro reported paths we cannot match (e.g. re-encoded
+                    # non-ASCII names); rerunning would loop on the same list.
+                    for path in remaining:
+                        errors[path] = "LibreOffice reported no status for this file"
+                    break
+
+                for path in remaining:
+                    state = states.get(path)
+                    if state == "error":
+                        errors[path] = "LibreOffice failed to recalculate the file"
+                    elif state == "start":
+                        errors[path] = "LibreOffice crashed or timed out on this file"
+                remaining = [path for path in remaining if path not in states]
+    except (OSError, RuntimeError):
+        return {path: "Failed to setup LibreOffice macro" for path in paths}
+    return errors
+
+
+def _run_session(cmd, env, timeout):
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        start_new_session=True,
+    )
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def _recalculate(abs_path, timeout, engine):
+    if engine in ("auto", "python"):
+        try:
+            recalculate_file(abs_path)
+            return "python", None
+        except Unsupported as e:
+            if engine == "python":
+                return None, {"error": f"Not supported by the Python engine: {e}"}
+        except Exception as e:
+            # The file is only rewritten after a full recalculation, so
+            # LibreOffice still sees the original workbook.
+            if engine == "python":
+                return None, {"error": str(e)}
+    return "libreoffice", None
+
+
+def _report(filename, used_engine, max_locations, stop_early, trace):
+    try:
+        result = scan_workbook(filename, max_locations, stop_early, trace)
     except Exception as e:
         return {"error": str(e)}
+    result["engine"] = used_engine
+    return result
+
+
+def recalc_batch(
+    filenames,
+    timeout=30,
+    max_locations=MAX_LOCATIONS,
+    stop_early=False,
+    engine="libreoffice",
+    trace=True,
+):
+    results = {}
+    engines = {}
+    pending = []
+    for filename in filenames:
+        if not Path(filename).exists():
+            results[filename] = {"error": f"File {filename} does not exist"}
+            continue
+        used_engine, error = _recalculate(str(Path(filename).absolute()), timeout, engine)
+        if error:
+            results[filename] = error
+        else:
+            engines[filename] = used_engine
+            if used_engine == "libreoffice":
+                pending.append(filename)
+
+    if pending:
+        paths = {str(Path(f).absolute()): f for f in pending}
+        if pool_request({"op": "status"}) is not None:
+            errors = {}
+            for path in paths:
+                response = pool_request({"op": "recalc", "input": path}, timeout=timeout)
+                if response is None or not response.get("ok"):
+                    errors[path] = (response or {}).get("error", "LibreOffice pool unavailable")
+        else:
+            errors = _recalc_batch_with_soffice(list(paths), timeout)
+        for path, error in errors.items():
+            results[paths[path]] = {"error": error}
+
+    for filename, used_engine in engines.items():
+        if filename not in results:
+            results[filename] = _report(filename, used_engine, max_locations, stop_early, trace)
+    return {filename: results[filename] for filename in filenames if filename in results}
+
+
+def recalc(
+    filename,
+    timeout=30,
+    max_locations=MAX_LOCATIONS,
+    stop_early=False,
+    engine="libreoffice",
+    trace=True,
+):
+    if not Path(filename).exists():
+        return {"error": f"File {filename} does not exist"}
+
+    abs_path = str(Path(filename).absolute())
+
+    used_engine, error = _recalculate(abs_path, timeout, engine)
+    if error:
+        return error
+
+    if used_engine == "libreoffice":
+        response = pool_request({"op": "recalc", "input": abs_path}, timeout=timeout)
+        if response is not None:
+            if not response.get("ok"):
+                return {"error": response.get("error")}
+        else:
+            error = _recalc_with_soffice(abs_path, timeout)
+            if error:
+                return error
+
+    return _report(filename, used_engine, max_locations, stop_early, trace)
+
+
+def scan_workbook(filename, max_locations=MAX_LOCATIONS, stop_early=False, trace=True):
+    error_details = {}
+    error_cells = {}
+    total_errors = 0
+    formula_count = 0
+    truncated = False
+
+    with zipfile.ZipFile(filename) as zf:
+        for sheet_name, part, ns in _worksheet_parts(zf):
+            formula_tag, value_tag = f"{ns}f", f"{ns}v"
+            for cell in _iter_cells(zf, part, ns):
+                if cell.find(formula_tag) is not None:
+                    formula_count += 1
+                if cell.get("t") != "e":
+                    continue
+
+                value = cell.findtext(value_tag) or ""
+                locations = error_details.setdefault(value, [])
+                locations.append(f"{sheet_name}!{cell.get('r')}")
+                total_errors += 1
+                if trace:
+                    r, c = split_address(cell.get("r"))
+                    error_cells[(sheet_name, r, c)] = value
+                if stop_early and total_errors >= max_locations:
+                    truncated = True
+                    break
+            if truncated:
+                break
+
+    result = {
+        "status": "success" if total_errors == 0 else "errors_found",
+        "total_errors": total_errors,
+        "error_summary": {},
+    }
+
+    ordered = [err for err in EXCEL_ERRORS if err in error_details]
+    ordered += [err for err in error_details if err not in EXCEL_ERRORS]
+    for err_type in ordered:
+        locations = error_details[err_type]
+        result["error_summary"][err_type] = {
+            "count": len(locations),
+            "locations": locations[:max_locations],
+        }
+
+    result["total_formulas"] = formula_count
+    if truncated:
+        result["truncated"] = True
+    elif error_cells:
+        # Tracing is best effort; the scan above is already complete.
+        try:
+            causes = root_causes(load_index(filename), error_cells)
+        except Exception as e:
+            result["root_causes_error"] = f"{type(e).__name__}: {e}"
+        else:
+            result["total_root_causes"] = len(causes)
+            result["root_causes"] = causes[:max_locations]
+
+    return result
+
+
+def _worksheet_parts(zf):
+    workbook = lxml.etree.fromstring(zf.read("xl/workbook.xml"))
+    ns = workbook.tag[: workbook.tag.index("}") + 1]
+    rels = lxml.etree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+
+    for sheet in workbook.iter("{*}sheet"):
+        target = targets.get(sheet.get(f"{{{REL_NS}}}id"))
+        if target is None:
+            continue
+        if target.startswith("/"):
+            part = target.lstrip("/")
+        else:
+            part = posixpath.normpath(posixpath.join("xl", target))
+        if part in zf.NameToInfo:
+            yield sheet.get("name"), part, ns
+
+
+def _iter_cells(zf, part, ns):
+    with zf.open(part) as f:
+        for _, row in lxml.etree.iterparse(
+            f,
+            events=("end",),
+            tag=f"{ns}row",
+            huge_tree=True,
+            resolve_entities=False,
+        ):
+            yield from row
+            row.clear()
+            while row.getprevious() is not None:
+                del row.getparent()[0]
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python recalc.py <excel_file> [timeout_seconds]")
-        print("\nRecalculates all formulas in an Excel file using LibreOffice")
-        print("\nReturns JSON with error details:")
-        print("  - status: 'success' or 'errors_found'")
-        print("  - total_errors: Total number of Excel errors found")
-        print("  - total_formulas: Number of formulas in the file")
-        print("  - error_summary: Breakdown by error type with locations")
-        print("    - #VALUE!, #DIV/0!, #REF!, #NAME?, #NULL!, #NUM!, #N/A")
-        sys.exit(1)
-
-    filename = sys.argv[1]
-    timeout = int(sys.argv[2]) if len(sys.argv) > 2 else 30
-
-    result = recalc(filename, timeout)
+    parser = argparse.ArgumentParser(
+        description="Recalculates all formulas in an Excel file",
+        epilog=(
+            "Returns JSON with status ('success' or 'errors_found'), total_errors, "
+            "total_formulas and error_summary (locations by error type, e.g. "
+            "#VALUE!, #DIV/0!, #REF!, #NAME?, #NULL!, #NUM!, #N/A)"
+        ),
+    )
+    parser.add_argument("excel_file", nargs="?")
+    parser.add_argument("timeout_seconds", nargs="?", type=int, default=30)
+    parser.add_argument(
+        "--batch",
+        nargs="+",
+        metavar="FILE",
+        help="Recalculate many files in one LibreOffice session; prints a report per file",
+    )
+    parser.add_argument(
+        "--max-locations",
+        type=int,
+        default=MAX_LOCATIONS,
+        help=f"Locations to report per error type (default: {MAX_LOCATIONS})",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["auto", "python", "libreoffice"],
+        default="libreoffice",
+        help=(
+            "python uses the in-process engine; auto tries it and falls back to "
+            "LibreOffice (default: libreoffice)"
+        ),
+    )
+    parser.add_argument(
+        "--stop-early",
+        action="store_true",
+        help="Stop scanning after --max-locations error cells (counts are then partial)",
+    )
+    parser.add_argument(
+        "--no-trace",
+        dest="trace",
+        action="store_false",
+        help="Skip tracing error cells back to their root causes",
+    )
+    args = parser.parse_args()
+
+    if args.batch:
+        files = ([args.excel_file] if args.excel_file else []) + args.batch
+        results = recalc_batch(
+            files,
+            args.timeout_seconds,
+            args.max_locations,
+            args.stop_early,
+            args.engine,
+            args.trace,
+        )
+        print(json.dumps(results, indent=2))
+        return
+    if not args.excel_file:
+        parser.error("excel_file is required")
+
+    result = recalc(
+        args.excel_file,
+        args.timeout_seconds,
+        args.max_locations,
+        args.stop_early,
+        args.engine,
+        args.trace,
+    )
     print(json.dumps(result, indent=2))
 
 
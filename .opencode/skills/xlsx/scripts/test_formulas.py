@@ -0,0 +1,128 @@
+import datetime
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+from formulas import DIV0, NA, NUM, Unsupported, Workbook  # noqa: E402
+from recalc import _recalculate  # noqa: E402
+
+CELLS = {
+    "A1": "abc",
+    "A2": 5,
+    "A3": True,
+    "A4": "5",
+    "A5": "#DIV/0!",
+    "C1": "x",
+    "C2": "y",
+    "D1": 1,
+    "D2": 2,
+}
+
+
+def evaluate(tmp_path, formula, cells=CELLS):
+    book = openpyxl.Workbook()
+    sheet = book.active
+    for address, value in cells.items():
+        sheet[address] = value
+    sheet["B1"] = f"={formula}"
+    path = tmp_path / "book.xlsx"
+    book.save(path)
+
+    wb = Workbook.load(path)
+    wb.recalculate()
+    return wb.get(sheet.title, "B1")
+
+
+@pytest.mark.parametrize(
+    "formula, expected",
+    [
+        ("SUM(A1)", 0.0),
+        ("MAX(A1,A2)", 5.0),
+        ("AVERAGE(A1,A2)", 5.0),
+        ("SUM(A3)", 0.0),
+        ("MIN(A3)", 0.0),
+        ("COUNT(A4)", 0.0),
+        ("SUM(A4)", 0.0),
+        ("SUM(A4,1)", 1.0),
+        ("COUNT(A2,\"5\")", 2.0),
+        ("SUM(TRUE,A2)", 6.0),
+    ],
+)
+def test_single_cell_references_skip_text_and_logicals(tmp_path, formula, expected):
+    assert evaluate(tmp_path, formula) == expected
+
+
+def test_single_cell_error_still_propagates(tmp_path):
+    assert evaluate(tmp_path, "SUM(A5)") == DIV0
+
+
+@pytest.mark.parametrize(
+    "formula", ["ISNUMBER(A5)", "ISTEXT(A5)", "ISBLANK(A5)", "ISLOGICAL(A5)", "ISNUMBER(1/0)"]
+)
+def test_is_functions_receive_errors_as_values(tmp_path, formula):
+    assert evaluate(tmp_path, formula) is False
+
+
+def test_vlookup_empty_range_lookup_is_exact(tmp_path):
+    cells = {"C1": 1, "C2": 3, "D1": "one", "D2": "three"}
+    assert evaluate(tmp_path, "VLOOKUP(2,C1:D2,2,)", cells) == NA
+    assert evaluate(tmp_path, "VLOOKUP(2,C1:D2,2)", cells) == "one"
+
+
+def test_hlookup_empty_range_lookup_is_exact(tmp_path):
+    cells = {"C1": 1, "D1": 3, "C2": "one", "D2": "three"}
+    assert evaluate(tmp_path, "HLOOKUP(2,C1:D2,2,)", cells) == NA
+    assert evaluate(tmp_path, "HLOOKUP(2,C1:D2,2)", cells) == "one"
+
+
+def test_date_cells_are_unsupported(tmp_path):
+    book = openpyxl.Workbook()
+    book.iso_dates = True
+    book.active["A1"] = datetime.datetime(2020, 1, 1)
+    book.active["B1"] = "=A1+1"
+    path = tmp_path / "dates.xlsx"
+    book.save(path)
+
+    with pytest.raises(Unsupported):
+        Workbook.load(path)
+    assert _recalculate(str(path), 30, "auto") == ("libreoffice", None)
+    assert _recalculate(str(path), 30, "python")[0] is None
+
+
+def test_auto_engine_falls_back_on_engine_errors(tmp_path, monkeypatch):
+    import recalc
+
+    def broken(path):
+        raise IndexError("list index out of range")
+
+    monkeypatch.setattr(recalc, "recalculate_file", broken)
+    path = str(tmp_path / "book.xlsx")
+    assert _recalculate(path, 30, "auto") == ("libreoffice", None)
+    assert _recalculate(path, 30, "python") == (None, {"error": "list index out of range"})
+
+
+def test_round_overflowing_decimal_is_num(tmp_path):
+    assert evaluate(tmp_path, "ROUND(1E300,2)") == NUM
+
+
+def test_sheet_scoped_names_resolve_per_sheet(tmp_path):
+    from openpyxl.workbook.defined_name import DefinedName
+
+    book = openpyxl.Workbook()
+    first = book.active
+    first.title = "First"
+    second = book.create_sheet("Second")
+    first["A1"] = 1
+    second["A1"] = 2
+    book.defined_names["RATE"] = DefinedName("RATE", attr_text="First!$A$1")
+    second.defined_names["RATE"] = DefinedName("RATE", attr_text="Second!$A$1")
+    first["B1"] = "=RATE*10"
+    second["B1"] = "=RATE*10"
+    path = tmp_path / "names.xlsx"
+    book.save(path)
+
+    wb = Workbook.load(path)
+    wb.recalculate()
+    assert wb.get("First", "B1") == 10.0
+    assert wb.get("Second", "B1") == 20.0
@@ -0,0 +1,68 @@
+import contextlib
+from pathlib import Path
+
+import pytest
+
+import recalc
+
+
+@contextlib.contextmanager
+def fake_profile(macro):
+    yield Path("/tmp/profile")
+
+
+def fake_soffice(monkeypatch, write_status):
+    calls = []
+
+    def run_session(cmd, env, timeout):
+        calls.append(Path(env["RECALC_BATCH_LIST"]).read_text().splitlines())
+        write_status(Path(env["RECALC_BATCH_STATUS"]), calls[-1])
+
+    monkeypatch.setattr(recalc, "libreoffice_profile", fake_profile)
+    monkeypatch.setattr(recalc, "_run_session", run_session)
+    return calls
+
+
+def test_batch_stops_when_no_status_line_matches(monkeypatch):
+    def write_status(status, paths):
+        status.write_text("".join(f"ok\t{path}-reencoded\n" for path in paths))
+
+    calls = fake_soffice(monkeypatch, write_status)
+    errors = recalc._recalc_batch_with_soffice(["/tmp/a.xlsx", "/tmp/b.xlsx"], 30)
+
+    assert len(calls) == 1
+    assert set(errors) == {"/tmp/a.xlsx", "/tmp/b.xlsx"}
+
+
+def test_batch_restarts_after_crash_and_accepts_crlf(monkeypatch):
+    def write_status(status, paths):
+        if len(paths) == 3:
+            status.write_text(f"ok\t{paths[0]}\r\nstart\t{paths[1]}\r\n")
+        else:
+            status.write_text(f"ok\t{paths[0]}\r\n")
+
+    calls = fake_soffice(monkeypatch, write_status)
+    errors = recalc._recalc_batch_with_soffice(["/tmp/a.xlsx", "/tmp/b.xlsx", "/tmp/c.xlsx"], 30)
+
+    assert calls == [["/tmp/a.xlsx", "/tmp/b.xlsx", "/tmp/c.xlsx"], ["/tmp/c.xlsx"]]
+    assert errors == {"/tmp/b.xlsx": "LibreOffice crashed or timed out on this file"}
+
+
+def test_trace_failure_keeps_scan_results(tmp_path, monkeypatch):
+    openpyxl = pytest.importorskip("openpyxl")
+
+    book = openpyxl.Workbook()
+    book.active["A1"] = "#DIV/0!"
+    path = tmp_path / "errors.xlsx"
+    book.save(path)
+
+    def broken(filename):
+        raise RecursionError("maximum recursion depth exceeded")
+
+    monkeypatch.setattr(recalc, "load_index", broken)
+    result = recalc.scan_workbook(str(path))
+
+    assert result["total_errors"] == 1
+    assert result["error_summary"]["#DIV/0!"]["locations"] == ["Sheet!A1"]
+    assert result["root_causes_error"] == "RecursionError: maximum recursion depth exceeded"
+    assert "root_causes" not in result